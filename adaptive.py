@@ -0,0 +1,233 @@
+"""Computerized adaptive testing (CAT) on a three-parameter logistic IRT model.
+
+Each item has a discrimination `a`, difficulty `b` and a guessing floor `c`
+(fixed at 1 / number of options). Parameters are fitted offline from the
+attempts stored in `sessions` by `calibrate()` and kept in `item_params`;
+items without enough responses use a=1, b=0.
+
+For a question-bank snapshot the app builds an `ItemBank` once: response
+probabilities, their logs and the Fisher information of every item on a
+fixed ability grid, as NumPy arrays. During an exam the ability estimate is
+the posterior mean (EAP) on that grid, and the next item is drawn at random
+from the TOP_K unused items with the most information at the grid point
+nearest the estimate ("randomesque" selection), so candidates of similar
+ability do not all sit the same paper and no item is shown to everyone. Both
+are a few vectorised array operations per click.
+
+Usage:
+    python adaptive.py calibrate
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bank_snapshots import OPTION_CODES, BankSnapshot, live_questions, load_snapshot, paper_questions
+
+
+DB_PATH = Path(os.environ.get("CBT_DATABASE", "cbt.db"))
+
+GRID = np.linspace(-4.0, 4.0, 81)
+LOG_PRIOR = -0.5 * GRID ** 2  # standard normal prior, up to a constant
+D = 1.702  # scaling constant that makes the logistic close to the normal ogive
+MIN_RESPONSES = 30  # below this an item keeps the default parameters
+BANK_TTL = 300  # seconds before a cached ItemBank picks up a new calibration
+TOP_K = 5  # next item is drawn from this many of the most informative
+START_TOP_K = 15  # wider choice for the first item, when nothing is known yet
+
+_rng = np.random.default_rng()
+
+
+def _probability(a: np.ndarray, b: np.ndarray, c: np.ndarray, theta: np.ndarray) -> np.ndarray:
+    """P(correct) for every (theta, item) pair; shape (len(theta), len(a))."""
+    return c + (1.0 - c) / (1.0 + np.exp(-D * a * (theta[:, None] - b)))
+
+
+def _guessing(question: Dict) -> float:
+    options = sum(1 for k in OPTION_CODES if question[k])
+    return 1.0 / max(options, 2)
+
+
+class ItemBank:
+    """Precomputed probability and information tables for one snapshot."""
+
+    def __init__(self, question_ids: Sequence[int], a: np.ndarray, b: np.ndarray, c: np.ndarray):
+        self.question_ids = np.asarray(question_ids, dtype=np.int64)
+        self.index = {int(q): i for i, q in enumerate(self.question_ids)}
+        p = np.clip(_probability(a, b, c, GRID), 1e-6, 1 - 1e-6)
+        self.log_p = np.log(p)
+        self.log_q = np.log1p(-p)
+        # 3PL Fisher information: (D a)^2 (q / p) ((p - c) / (1 - c))^2
+        self.info = ((D * a) ** 2 * ((1 - p) / p) * ((p - c) / (1 - c)) ** 2).astype(np.float32)
+
+    def posterior(self, responses: Iterable[Tuple[int, bool]]) -> np.ndarray:
+        log_post = LOG_PRIOR.copy()
+        for question_id, correct in responses:
+            i = self.index.get(question_id)
+            if i is not None:
+                log_post += self.log_p[:, i] if correct else self.log_q[:, i]
+        post = np.exp(log_post - log_post.max())
+        return post / post.sum()
+
+    def estimate(self, responses: Iterable[Tuple[int, bool]]) -> Tuple[float, float]:
+        """Return the EAP ability estimate and its posterior standard deviation."""
+        post = self.posterior(responses)
+        theta = float(post @ GRID)
+        return theta, float(np.sqrt(post @ (GRID - theta) ** 2))
+
+    def next_item(self, theta: float, exclude: Iterable[int], top_k: int = TOP_K,
+                  rng: Optional[np.random.Generator] = None) -> Optional[int]:
+        """A random pick among the `top_k` most informative unused questions at
+        `theta`, or None if none are left."""
+        row = self.info[int(np.abs(GRID - theta).argmin())].copy()
+        excluded = [self.index[q] for q in exclude if q in self.index]
+        row[excluded] = -1.0
+        k = min(top_k, len(row) - len(set(excluded)))
+        if k <= 0:
+            return None
+        best = np.argpartition(row, -k)[-k:]
+        return int(self.question_ids[(rng or _rng).choice(best)])
+
+
+def _load_params(conn: sqlite3.Connection) -> Dict[int, Tuple[float, float]]:
+    return {r[0]: (r[1], r[2]) for r in conn.execute("SELECT question_id, a, b FROM item_params")}
+
+
+def build_item_bank(conn: sqlite3.Connection, snapshot: BankSnapshot) -> ItemBank:
+    params = _load_params(conn)
+    questions = list(snapshot)
+    ids = [q["id"] for q in questions]
+    a = np.array([params.get(q, (1.0, 0.0))[0] for q in ids])
+    b = np.array([params.get(q, (1.0, 0.0))[1] for q in ids])
+    c = np.array([_guessing(q) for q in questions])
+    return ItemBank(ids, a, b, c)
+
+
+_banks: Dict[int, Tuple[float, ItemBank]] = {}
+_banks_lock = threading.Lock()
+
+
+def get_item_bank(conn: sqlite3.Connection, snapshot_id: int) -> ItemBank:
+    """Return the cached ItemBank for a snapshot, rebuilding it after BANK_TTL."""
+    cached = _banks.get(snapshot_id)
+    if cached is not None and time.time() - cached[0] < BANK_TTL:
+        return cached[1]
+    bank = build_item_bank(conn, load_snapshot(conn, snapshot_id))
+    with _banks_lock:
+        _banks[snapshot_id] = (time.time(), bank)
+    return bank
+
+
+# --- Offline calibration ---
+def response_matrix(conn: sqlite3.Connection) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Score every submitted attempt into (question ids, guessing, responses, mask).
+
+    `responses` and `mask` are (attempts x items) float arrays; `mask` marks
+    the items that were on each attempt's paper.
+    """
+    live = live_questions(conn)
+    rows = conn.execute(
+        "SELECT question_ids, answers, snapshot_id FROM sessions WHERE submitted_at IS NOT NULL"
+    ).fetchall()
+
+    keys: Dict[int, Tuple[str, float]] = {}
+    scored: List[Dict[int, float]] = []
+    for question_ids, answers, snapshot_id in rows:
+        answers = json.loads(answers or "{}")
+        attempt: Dict[int, float] = {}
+        for qid, question in paper_questions(conn, snapshot_id, json.loads(question_ids), live).items():
+            keys.setdefault(qid, (question["correct_option"], _guessing(question)))
+            attempt[qid] = float(answers.get(str(qid)) == question["correct_option"])
+        scored.append(attempt)
+
+    ids = np.array(sorted(keys), dtype=np.int64)
+    column = {int(q): i for i, q in enumerate(ids)}
+    responses = np.zeros((len(scored), len(ids)))
+    mask = np.zeros_like(responses)
+    for n, attempt in enumerate(scored):
+        cols = [column[q] for q in attempt]
+        responses[n, cols] = list(attempt.values())
+        mask[n, cols] = 1.0
+    guessing = np.array([keys[int(q)][1] for q in ids])
+    return ids, guessing, responses, mask
+
+
+def fit_3pl(responses: np.ndarray, mask: np.ndarray, c: np.ndarray,
+            cycles: int = 40, newton_steps: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """Marginal maximum likelihood (EM on the ability grid) for a and b.
+
+    Every step works on whole arrays: the E-step is two matrix products over
+    all attempts, the M-step a few Newton-style updates over all items.
+    """
+    n_items = responses.shape[1]
+    a = np.ones(n_items)
+    b = np.zeros(n_items)
+    right = responses * mask
+    wrong = (1.0 - responses) * mask
+    for _ in range(cycles):
+        p = np.clip(_probability(a, b, c, GRID), 1e-6, 1 - 1e-6)
+        # E-step: posterior weight of each grid point for each attempt
+        log_like = right @ np.log(p).T + wrong @ np.log1p(-p).T + LOG_PRIOR
+        w = np.exp(log_like - log_like.max(axis=1, keepdims=True))
+        w /= w.sum(axis=1, keepdims=True)
+        n_g = w.T @ mask   # expected attempts per grid point and item
+        r_g = w.T @ right  # expected correct answers
+        # M-step: Fisher scoring on the expected complete-data likelihood
+        for _ in range(newton_steps):
+            p = np.clip(_probability(a, b, c, GRID), 1e-6, 1 - 1e-6)
+            star = (p - c) / (1 - c)                   # 2PL part of the curve
+            resid = (r_g - n_g * p) * star / p          # d loglik / d logit
+            dz_da = D * (GRID[:, None] - b)
+            dz_db = -D * a
+            weight = n_g * star ** 2 * (1 - p) / p      # expected information
+            grad_a = (resid * dz_da).sum(axis=0)
+            grad_b = (resid * dz_db).sum(axis=0)
+            info_a = (weight * dz_da ** 2).sum(axis=0) + 1e-6
+            info_b = (weight * dz_db ** 2).sum(axis=0) + 1e-6
+            a = np.clip(a + grad_a / info_a, 0.2, 3.0)
+            b = np.clip(b + grad_b / info_b, -4.0, 4.0)
+    return a, b
+
+
+def calibrate(conn: sqlite3.Connection) -> int:
+    """Fit item parameters from all submitted attempts; returns items calibrated."""
+    ids, c, responses, mask = response_matrix(conn)
+    counts = mask.sum(axis=0)
+    keep = counts >= MIN_RESPONSES
+    if not keep.any():
+        return 0
+    a, b = fit_3pl(responses[:, keep], mask[:, keep], c[keep])
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO item_params (question_id, a, b, n_responses, calibrated_at)
+        VALUES (?, ?, ?, ?, datetime('now'))
+        """,
+        [(int(q), float(x), float(y), int(n)) for q, x, y, n in zip(ids[keep], a, b, counts[keep])],
+    )
+    conn.commit()
+    return int(keep.sum())
+
+
+def main() -> None:
+    from init_db import ensure_runtime_schema
+
+    parser = argparse.ArgumentParser(description="Calibrate IRT item parameters from past attempts")
+    parser.add_argument("command", choices=["calibrate"])
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args()
+    with sqlite3.connect(args.db) as conn:
+        ensure_runtime_schema(conn)
+        started = time.perf_counter()
+        count = calibrate(conn)
+    print(f"✅ Calibrated {count} items in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
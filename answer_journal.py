@@ -0,0 +1,268 @@
+"""Append-only journal of answer changes.
+
+Every answer a candidate selects in `exam()` is appended to a per-day segment
+file (`cbt-journal/answers-YYYYMMDD.log`) before the request returns. The journal
+is the durable record of the click: it survives a worker crash or a locked
+database, and it keeps the full history of answer changes for disputes.
+
+Writes are cheap sequential appends. Concurrent writers in one process are
+group-committed: whoever finds no fsync in flight flushes the segment for
+everyone who appended before it, and the rest wait for that single fsync.
+
+A compactor folds new events into the `answers` table (last write wins per
+candidate and question, current attempt only) and advances a per-segment
+checkpoint. Running it at startup is the crash-recovery replay; the app also
+runs it on a background thread. Segments read up to their checkpoint are
+skipped without being opened, and once a day is over and fully folded in its
+segment is moved to `retired/`, where `history` and `replay` still read it.
+
+Record format, one per line: `<crc32 hex>\t<json>\n`. A torn or corrupt line
+(e.g. a crash mid-write) fails the CRC check and is skipped; the next writer
+to open the segment terminates a torn tail so its own records stay whole.
+
+Usage:
+    python answer_journal.py compact
+    python answer_journal.py replay       # rebuild answers from the whole journal
+    python answer_journal.py history USER_ID
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+DB_PATH = Path(os.environ.get("CBT_DATABASE", "cbt.db"))
+# one journal per database, so an edge node and the central server can share a directory
+JOURNAL_DIR = Path(os.environ.get("CBT_JOURNAL_DIR", DB_PATH.with_name(DB_PATH.stem + "-journal")))
+COMPACT_INTERVAL = 5.0  # seconds between background compactions
+RETIRED = "retired"  # subdirectory for segments that are fully compacted
+RETIRE_GRACE = 3600.0  # seconds after midnight UTC before the previous day's segment retires
+
+
+def segment_name(ts: float) -> str:
+    return time.strftime("answers-%Y%m%d.log", time.gmtime(ts))
+
+
+def encode(event: Dict) -> bytes:
+    body = json.dumps(event, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return b"%08x\t%s\n" % (zlib.crc32(body), body)
+
+
+def decode(line: bytes) -> Optional[Dict]:
+    """Return the event stored in `line`, or None if it is torn or corrupt."""
+    if not line.endswith(b"\n"):
+        return None
+    crc, _, body = line.rstrip(b"\n").partition(b"\t")
+    try:
+        if int(crc, 16) != zlib.crc32(body):
+            return None
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+class AnswerJournal:
+    """Group-committing appender shared by all requests in a worker process."""
+
+    def __init__(self, directory: Path = JOURNAL_DIR):
+        self.directory = directory
+        self._cond = threading.Condition()
+        self._segment: Optional[str] = None
+        self._fd: Optional[int] = None
+        self._written = 0   # appends issued by this process
+        self._synced = 0    # appends known to be on disk
+        self._syncing = False
+
+    def _open_segment(self, name: str) -> int:
+        if self._segment != name:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if self._fd is not None:
+                while self._syncing:
+                    # another thread is still fsyncing the old segment
+                    self._cond.wait()
+                os.fsync(self._fd)
+                os.close(self._fd)
+                self._synced = self._written
+            self._fd = os.open(self.directory / name, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            size = os.fstat(self._fd).st_size
+            if size and os.pread(self._fd, 1, size - 1) != b"\n":
+                # torn tail from a crash mid-write: end it, or our first
+                # record would be glued onto it and fail its CRC
+                os.write(self._fd, b"\n")
+            self._segment = name
+        return self._fd
+
+    def append(self, user_id: str, attempt_id: Optional[int], question_id: int, option: str) -> float:
+        """Durably record one answer selection and return its timestamp.
+
+        Returns once the record is fsynced.
+        """
+        ts = time.time()
+        line = encode({"ts": ts, "user_id": user_id, "attempt_id": attempt_id,
+                       "question_id": question_id, "option": option})
+        with self._cond:
+            # a single O_APPEND write keeps lines whole across worker processes
+            os.write(self._open_segment(segment_name(ts)), line)
+            self._written += 1
+            ticket = self._written
+            while self._synced < ticket:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                self._syncing = True
+                target, fd = self._written, self._fd
+                self._cond.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._synced = max(self._synced, target)
+                    self._cond.notify_all()
+        return ts
+
+
+def read_segment(path: Path, offset: int = 0) -> Iterator[Tuple[int, Dict]]:
+    """Yield (offset after record, event) for each valid record from `offset`."""
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        for line in fh:
+            if not line.endswith(b"\n"):
+                # torn tail from a crash mid-write; leave it for the next pass
+                return
+            offset += len(line)
+            event = decode(line)
+            if event is not None:
+                yield offset, event
+
+
+def segments(directory: Path = JOURNAL_DIR, retired: bool = False) -> List[Path]:
+    """Live segments, oldest first; with `retired`, the retired ones before them."""
+    paths = sorted(directory.glob("answers-*.log")) if directory.exists() else []
+    if retired:
+        paths = segments(directory / RETIRED) + paths
+    return paths
+
+
+def compact(conn: sqlite3.Connection, directory: Path = JOURNAL_DIR, retired: bool = False) -> int:
+    """Fold journal events past the checkpoint into `answers`; returns events applied.
+
+    Runs in one IMMEDIATE transaction so concurrent compactors in other
+    workers serialise and each event is applied once. With `retired`, the
+    retired segments are read in full first (used by `replay`).
+    """
+    applied = 0
+    retire_before = segment_name(time.time() - RETIRE_GRACE)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        checkpoints = dict(conn.execute("SELECT segment, position FROM journal_checkpoints").fetchall())
+        latest: Dict[Tuple[str, int], Dict] = {}
+        for path in segments(directory / RETIRED) if retired else []:
+            for _, event in read_segment(path):
+                latest[(event["user_id"], event["question_id"])] = event
+                applied += 1
+        for path in segments(directory):
+            start = checkpoints.get(path.name, 0)
+            if start >= path.stat().st_size:
+                if path.name < retire_before:
+                    # a past day, fully folded in: nobody appends to it any more
+                    (directory / RETIRED).mkdir(exist_ok=True)
+                    conn.execute("DELETE FROM journal_checkpoints WHERE segment=?", (path.name,))
+                    os.replace(path, directory / RETIRED / path.name)
+                continue
+            end = start
+            for end, event in read_segment(path, start):
+                latest[(event["user_id"], event["question_id"])] = event
+                applied += 1
+            if end != start:
+                conn.execute(
+                    "INSERT OR REPLACE INTO journal_checkpoints (segment, position) VALUES (?, ?)",
+                    (path.name, end),
+                )
+
+        current_attempt: Dict[str, Optional[int]] = {}
+        for (user_id, question_id), event in latest.items():
+            if user_id not in current_attempt:
+                row = conn.execute("SELECT MAX(id) FROM sessions WHERE user_id=?", (user_id,)).fetchone()
+                current_attempt[user_id] = row[0]
+            # events from an earlier attempt must not resurrect cleared answers
+            if event.get("attempt_id") != current_attempt[user_id]:
+                continue
+            conn.execute("DELETE FROM answers WHERE user_id=? AND question_id=?", (user_id, question_id))
+            conn.execute(
+                "INSERT INTO answers (user_id, question_id, selected_option, answered_at) VALUES (?, ?, ?, ?)",
+                (user_id, question_id, event["option"], event["ts"]),
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
+
+
+def replay(conn: sqlite3.Connection, directory: Path = JOURNAL_DIR) -> int:
+    """Rebuild current answers from the whole journal, ignoring checkpoints."""
+    conn.execute("DELETE FROM journal_checkpoints")
+    conn.commit()
+    return compact(conn, directory, retired=True)
+
+
+def history(user_id: str, directory: Path = JOURNAL_DIR) -> Iterator[Dict]:
+    """Yield every recorded answer change for one candidate, oldest first."""
+    for path in segments(directory, retired=True):
+        for _, event in read_segment(path):
+            if event["user_id"] == user_id:
+                yield event
+
+
+def start_background_compactor(db_path: Path, directory: Path = JOURNAL_DIR,
+                               interval: float = COMPACT_INTERVAL) -> threading.Thread:
+    """Run `compact()` every `interval` seconds on a daemon thread."""
+    def _loop():
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        while True:
+            time.sleep(interval)
+            try:
+                compact(conn, directory)
+            except sqlite3.OperationalError as exc:
+                # database busy or locked; the events stay in the journal
+                print(f"⚠ Journal compaction deferred: {exc}", file=sys.stderr)
+
+    thread = threading.Thread(target=_loop, name="answer-journal-compactor", daemon=True)
+    thread.start()
+    return thread
+
+
+def main() -> None:
+    from init_db import ensure_runtime_schema
+
+    parser = argparse.ArgumentParser(description="Answer journal maintenance")
+    parser.add_argument("command", choices=["compact", "replay", "history"])
+    parser.add_argument("user_id", nargs="?")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--journal", type=Path, default=JOURNAL_DIR)
+    args = parser.parse_args()
+
+    if args.command == "history":
+        if not args.user_id:
+            parser.error("history needs a USER_ID")
+        for event in history(args.user_id, args.journal):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(event["ts"]))
+            print(f"{stamp}  attempt={event['attempt_id']}  q={event['question_id']}  {event['option']}")
+        return
+
+    with sqlite3.connect(args.db, timeout=30, isolation_level=None) as conn:
+        ensure_runtime_schema(conn)
+        applied = replay(conn, args.journal) if args.command == "replay" else compact(conn, args.journal)
+    print(f"✅ Applied {applied} journal events")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,11 @@ except Exception:
     # best-effort only; if markupsafe isn't available we'll surface the
     # original import error when attempting to import `flask_wtf`.
     pass
+try:
+    # Adaptive exams need NumPy; without it every exam uses a fixed paper.
+    import adaptive
+except ImportError:
+    adaptive = None
 try:
     from flask_wtf import CSRFProtect
     from flask_wtf.csrf import CSRFError
@@ -29,9 +34,21 @@ except Exception:
     CSRFProtect = None
     CSRFError = None
     _HAS_FLASK_WTF = False
+import os
 import sqlite3
+import threading
 import time
-from typing import Dict, List
+
+from sqlalchemy.engine import Connection
+
+import answer_journal
+import archive
+import bank_snapshots
+import edge_sync
+import repository
+import scorecards
+import similarity_index
+from init_db import ensure_runtime_schema
 
 
 # --- Flask setup ---
@@ -70,25 +87,62 @@ app.config.update(
 
 
 # --- Database helper ---
-DATABASE = "cbt.db"
+# Edge nodes (see `edge_sync.py`) run this same app against their own file.
+DATABASE = os.environ.get("CBT_DATABASE", "cbt.db")
+NODE_ROLE = os.environ.get("CBT_NODE_ROLE", "central")
+PAPER_SIZE = 50
+# "fixed" (random paper, free navigation) or "adaptive" (see `adaptive.py`)
+EXAM_MODE = os.environ.get("CBT_EXAM_MODE", "fixed")
+_schema_ready = False
+_schema_lock = threading.Lock()
+journal = answer_journal.AnswerJournal()
+
+# Flask-SQLAlchemy resolves relative SQLite paths against the instance folder
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.abspath(DATABASE)
+repository.sqla.init_app(app)
 
 
 def get_db() -> sqlite3.Connection:
-    """Return a SQLite connection stored on Flask's `g` object.
+    """Return the request's SQLite connection, stored on Flask's `g` object.
 
+    It is the DBAPI connection under the pooled SQLAlchemy connection from
+    `get_conn()`, so the repository layer and the modules that use sqlite3
+    directly share one connection per request, reused across requests.
     The connection uses `sqlite3.Row` so rows behave like dicts.
     """
+    global _schema_ready
     if "db" not in g:
-        g.db = sqlite3.connect(DATABASE)
+        g.conn = repository.sqla.engine.connect()
+        g.db = g.conn.connection.driver_connection
         g.db.row_factory = sqlite3.Row
+        if not _schema_ready:
+            # concurrent first requests: only one starts the background threads
+            with _schema_lock:
+                if not _schema_ready:
+                    ensure_runtime_schema(g.db)
+                    with g.conn.begin():
+                        similarity_index.ensure_index(g.db)
+                    # replay answers journalled before a crash, then keep folding in the background
+                    answer_journal.compact(g.db)
+                    answer_journal.start_background_compactor(DATABASE)
+                    archive.start_maintenance_scheduler(DATABASE)
+                    _schema_ready = True
     return g.db
 
 
+def get_conn() -> Connection:
+    """Return the request's SQLAlchemy connection, for `repository` functions."""
+    get_db()
+    return g.conn
+
+
 @app.teardown_appcontext
 def close_db(exception) -> None:
-    db = g.pop("db", None)
-    if db is not None:
-        db.close()
+    g.pop("db", None)
+    conn = g.pop("conn", None)
+    if conn is not None:
+        # back to the pool; uncommitted work is rolled back
+        conn.close()
 
 
 
@@ -105,10 +159,8 @@ def login():
         pin = request.form.get("pin", "").strip()
 
         db = get_db()
-        user = db.execute(
-            "SELECT * FROM users WHERE user_id=? AND pin=? AND active=1",
-            (user_id, pin),
-        ).fetchone()
+        conn = get_conn()
+        user = repository.find_active_user(conn, user_id, pin)
 
         if user:
             # Clear any existing session state to avoid leftover flags
@@ -117,14 +169,33 @@ def login():
             # store user id in session
             flask_session["user_id"] = user_id
 
-            # clear any previous answers for this user
-            db.execute("DELETE FROM answers WHERE user_id=?", (user_id,))
-            db.commit()
-
-            # load question ids and initialize progress
-            rows = db.execute("SELECT id FROM questions ORDER BY RANDOM () LIMIT 50").fetchall() # To limit questions, replace with "SELECT id FROM questions ORDER BY RANDOM () LIMIT 50"
-            flask_session["questions"] = [r["id"] for r in rows]
+            # draw the paper from the current question-bank snapshot; the
+            # attempt stays pinned to it even if questions are edited later
+            snapshot_id = bank_snapshots.ensure_current_snapshot(db)
+            snapshot = bank_snapshots.load_snapshot(db, snapshot_id)
+            if EXAM_MODE == "adaptive" and adaptive is not None:
+                # items are chosen one at a time; start at average ability,
+                # spreading first items over a wider set than later ones
+                first = adaptive.get_item_bank(db, snapshot_id).next_item(0.0, (), adaptive.START_TOP_K)
+                flask_session["questions"] = [first] if first is not None else []
+                flask_session["adaptive"] = True
+                flask_session["paper_size"] = min(PAPER_SIZE, len(snapshot))
+            else:
+                flask_session["questions"] = similarity_index.draw_paper(
+                    snapshot.ids(), PAPER_SIZE, similarity_index.sibling_map(db)
+                )
+            flask_session["snapshot_id"] = snapshot_id
             flask_session["current_q"] = 0
+            # answers for this attempt; the journal is the durable copy
+            flask_session["answers"] = {}
+            flask_session["answer_times"] = {}
+
+            # clear previous answers and record the attempt so it can be
+            # finalised, audited and synced
+            flask_session["attempt_id"] = repository.start_attempt(
+                conn, user_id, flask_session["questions"], snapshot_id
+            )
+            conn.commit()
             flask_session["instructions_shown"] = False
             # exam_start will be set when user clicks "Start Exam"
 
@@ -139,6 +210,12 @@ def login():
 @app.route("/exam", methods=["GET", "POST"])
 def exam():
     """Display and handle navigation/answer submission for the exam."""
+    if "snapshot_id" not in flask_session:
+        # no paper in this session (or one drawn before snapshots existed)
+        return redirect(url_for("login"))
+    if flask_session.get("submitted"):
+        # the attempt is finalised; its scorecard can no longer change
+        return redirect(url_for("results"))
     db = get_db()
     # (no debug prints) determine exam state normally
 
@@ -160,13 +237,24 @@ def exam():
         current_index = int(flask_session.get("current_q", 0))
         question_id = flask_session["questions"][current_index]
 
-        # Save answer if provided
-        if selected_option:
-            db.execute(
-                "INSERT OR REPLACE INTO answers (user_id, question_id, selected_option) VALUES (?, ?, ?)",
-                (flask_session["user_id"], question_id, selected_option),
+        # Save answer if provided: append to the journal (folded into
+        # `answers` by the compactor) and keep this attempt's copy in the session.
+        # The saved option is pre-checked, so Back/Next resubmits it unchanged;
+        # only a changed answer is journalled and gets a new answer time.
+        if selected_option and selected_option != flask_session.get("answers", {}).get(str(question_id)):
+            answered_at = journal.append(
+                flask_session["user_id"], flask_session.get("attempt_id"), question_id, selected_option
             )
-            db.commit()
+            flask_session["answers"] = {**flask_session.get("answers", {}), str(question_id): selected_option}
+            flask_session["answer_times"] = {**flask_session.get("answer_times", {}), str(question_id): answered_at}
+
+        if flask_session.get("adaptive"):
+            # adaptive papers only move forward; pick the next item on "next"
+            jump_to = None
+            if action == "previous":
+                action = None
+            elif action == "next" and current_index == len(flask_session["questions"]) - 1:
+                _administer_next_item(db)
 
         # Jump navigation (takes precedence)
         if jump_to is not None:
@@ -215,91 +303,94 @@ def exam():
         if remaining <= 0:
             return redirect(url_for("results"))
 
-    # Fetch current question and saved answer
+    # Current question, saved answer and navigator state in one pass (no SQL)
     current_q_index = int(flask_session.get("current_q", 0))
-    question_id = flask_session["questions"][current_q_index]
-    question = db.execute("SELECT * FROM questions WHERE id=?", (question_id,)).fetchone()
-
-    saved_answer = db.execute(
-        "SELECT * FROM answers WHERE user_id=? AND question_id=?",
-        (flask_session["user_id"], question_id),
-    ).fetchone()
-
-    # Prepare navigation states used by the template
-    rows = db.execute("SELECT question_id FROM answers WHERE user_id=?", (flask_session["user_id"],)).fetchall()
-    answered_map = {r["question_id"]: True for r in rows}
-
-    nav_states = [
-        {"index": idx, "answered": qid in answered_map, "active": idx == current_q_index}
-        for idx, qid in enumerate(flask_session["questions"]) ]
+    page = repository.exam_page(
+        bank_snapshots.load_snapshot(db, flask_session["snapshot_id"]),
+        flask_session["questions"],
+        current_q_index,
+        flask_session.get("answers", {}),
+    )
 
     return render_template(
         "exam.html",
-        question=question,
+        question=page.question,
         current_q=current_q_index,
-        total_q=len(flask_session["questions"]),
-        saved_answer=saved_answer,
-        nav_states=nav_states,
+        total_q=flask_session.get("paper_size", len(flask_session["questions"])),
+        saved_answer=page.saved_answer,
+        nav_states=page.nav_states,
         remaining=remaining,
         show_instructions=not flask_session.get("instructions_shown", False),
+        adaptive=flask_session.get("adaptive", False),
     )
 
 
+def _administer_next_item(db: sqlite3.Connection) -> None:
+    """Re-estimate ability and append the most informative unused item."""
+    questions = flask_session["questions"]
+    if len(questions) >= flask_session["paper_size"]:
+        return
+    snapshot = bank_snapshots.load_snapshot(db, flask_session["snapshot_id"])
+    bank = adaptive.get_item_bank(db, flask_session["snapshot_id"])
+    answers = flask_session.get("answers", {})
+    responses = [(qid, answers.get(str(qid)) == snapshot.get(qid)["correct_option"]) for qid in questions]
+    theta, _ = bank.estimate(responses)
+
+    # keep near-duplicates of items already seen off the paper while possible
+    exclude = set(questions) | similarity_index.siblings_of(db, questions)
+    next_id = bank.next_item(theta, exclude)
+    if next_id is None:
+        next_id = bank.next_item(theta, questions)
+    if next_id is not None:
+        flask_session["questions"] = [*questions, next_id]
+
+
 # --- Results route ---
 @app.route("/results")
 def results():
     """Compute and display exam results for the current user."""
-    if "user_id" not in flask_session:
+    if "user_id" not in flask_session or "snapshot_id" not in flask_session:
         return redirect(url_for("login"))
 
     db = get_db()
-    questions = db.execute("SELECT * FROM questions").fetchall()
+    attempt_id = flask_session.get("attempt_id")
+    snapshot_id = flask_session["snapshot_id"]
 
-    answers = {
-        a["question_id"]: a["selected_option"]
-        for a in db.execute("SELECT * FROM answers WHERE user_id=?", (flask_session["user_id"],)).fetchall()
-    }
+    # A finalised attempt already has an immutable scorecard
+    card = scorecards.get_scorecard(db, attempt_id, snapshot_id) if attempt_id else None
 
-    score = 0
-    answered_count = 0
-    skipped_count = 0
-    detailed_results: List[Dict] = []
+    if card is None:
+        # Score the candidate's own paper against the snapshot it was drawn from
+        snapshot = bank_snapshots.load_snapshot(db, snapshot_id)
+        questions = [q for q in map(snapshot.get, flask_session["questions"]) if q is not None]
 
-    option_map = {"option_a": "A", "option_b": "B", "option_c": "C", "option_d": "D"}
+        conn = get_conn()
+        rows = repository.saved_answers(conn, flask_session["user_id"])
+        answers = {a.question_id: a.selected_option for a in rows}
+        answer_times = {a.question_id: a.answered_at for a in rows if a.answered_at is not None}
+        # the compactor may not have folded the latest journal events in yet
+        answers.update({int(k): v for k, v in flask_session.get("answers", {}).items()})
+        answer_times.update({int(k): v for k, v in flask_session.get("answer_times", {}).items()})
 
-    for q in questions:
-        user_answer = answers.get(q["id"])
-        correct_option = q["correct_option"]
+        card = scorecards.build_scorecard(questions, answers)
 
-        if user_answer:
-            answered_count += 1
-        else:
-            skipped_count += 1
-
-        is_correct = (user_answer == correct_option) if user_answer else False
-        if is_correct:
-            score += 1
-
-        detailed_results.append({
-            "question": q["question"],
-            "options": {
-                "option_a": q["option_a"],
-                "option_b": q["option_b"],
-                "option_c": q["option_c"],
-                "option_d": q["option_d"],
-            },
-            "user_answer": option_map.get(user_answer, "Unanswered"),
-            "correct_answer": option_map.get(correct_option, correct_option),
-            "is_correct": is_correct,
-        })
+        # Finalise the attempt the first time results are shown
+        if attempt_id:
+            repository.finalise_attempt(conn, attempt_id, answers, answer_times, card["score"])
+            scorecards.store_scorecard(db, attempt_id, snapshot_id, card)
+            conn.commit()
+            # a concurrent request may have stored its scorecard first
+            card = scorecards.get_scorecard(db, attempt_id, snapshot_id) or card
+
+    flask_session["submitted"] = True
 
     return render_template(
         "results.html",
-        score=score,
-        total=len(questions),
-        answered=answered_count,
-        skipped=skipped_count,
-        results=detailed_results,
+        score=card["score"],
+        total=card["total"],
+        answered=card["answered"],
+        skipped=card["skipped"],
+        results=card["results"],
     )
 
 
@@ -317,13 +408,11 @@ def admin_login():
         username = request.form.get("username", "").strip()
         pin = request.form.get("pin", "").strip()
 
-        # reuse get_db to keep connections consistent
-        db = get_db()
-        row = db.execute("SELECT id FROM admins WHERE username=? AND pin=? AND active=1", (username, pin)).fetchone()
+        admin_id = repository.find_active_admin(get_conn(), username, pin)
 
-        if row:
+        if admin_id is not None:
             flask_session["is_admin"] = True
-            flask_session["admin_id"] = row["id"]
+            flask_session["admin_id"] = admin_id
             return redirect(url_for("admin_dashboard"))
 
         error = "Invalid credentials or inactive admin."
@@ -340,53 +429,48 @@ def admin_dashboard():
 
 @app.route("/admin/users", methods=["GET", "POST"])
 def admin_users():
-    db = get_db()
+    conn = get_conn()
 
     if request.method == "POST":
         user_id = request.form.get("user_id", "").strip()
         pin = request.form.get("pin", "").strip()
-        message = None
-        try:
-            db.execute("INSERT INTO users (user_id, pin, active) VALUES (?, ?, ?)", (user_id, pin, 1))
-            db.commit()
+        if repository.add_user(conn, user_id, pin):
+            conn.commit()
             message = f"✅ User {user_id} added successfully!"
-        except sqlite3.IntegrityError:
+        else:
             message = f"⚠ User ID {user_id} already exists."
 
-        users = db.execute("SELECT * FROM users WHERE active=1 ORDER BY id").fetchall()
-        return render_template("admin_users.html", users=users, message=message)
+        return render_template("admin_users.html", users=repository.list_users(conn), message=message)
 
-    users = db.execute("SELECT * FROM users WHERE active=1 ORDER BY id").fetchall()
-    return render_template("admin_users.html", users=users)
+    return render_template("admin_users.html", users=repository.list_users(conn))
 
 
 @app.route('/admin/inactive_users')
 def admin_inactive_users():
     """Show inactive users for audit/restore."""
-    db = get_db()
-    users = db.execute("SELECT * FROM users WHERE active=0 ORDER BY id").fetchall()
+    users = repository.list_users(get_conn(), active=False)
     return render_template('admin_inactive_users.html', users=users)
 
 
+@app.route("/admin/integrity")
+def admin_integrity():
+    """List answer-similarity and timing flags written by `integrity.py analyse`."""
+    if not flask_session.get("is_admin"):
+        return redirect(url_for("admin_login"))
+    conn = get_conn()
+    cohorts = repository.integrity_cohorts(conn)
+    cohort = request.args.get("cohort") or (cohorts[0] if cohorts else None)
+    flags = repository.integrity_flags(conn, cohort) if cohort else []
+    return render_template("admin_integrity.html", cohorts=cohorts, cohort=cohort, flags=flags)
+
+
 @app.route("/delete_user/<int:user_id>", methods=["POST"])
 def delete_user(user_id: int):
-    db = get_db()
-    # Find the user's string `user_id` (login id) so we can remove related rows
-    row = db.execute("SELECT user_id FROM users WHERE id=?", (user_id,)).fetchone()
-    if row:
-        uid = row["user_id"]
-        # Remove answers and saved sessions for this user to avoid orphaned data
-        db.execute("DELETE FROM answers WHERE user_id=?", (uid,))
-        # If a sessions table is used, remove attempts tied to this user
-        try:
-            db.execute("DELETE FROM sessions WHERE user_id=?", (uid,))
-        except sqlite3.OperationalError:
-            # sessions table may not exist in some schemas; ignore if missing
-            pass
-        # Finally remove the user record
-        db.execute("DELETE FROM users WHERE id=?", (user_id,))
-        db.commit()
-
+    conn = get_conn()
+    # Also removes their answers and attempts to avoid orphaned data
+    uid = repository.delete_user(conn, user_id)
+    if uid is not None:
+        conn.commit()
         flash(f"User '{uid}' deleted.")
 
     return redirect(url_for("admin_users"))
@@ -394,39 +478,31 @@ def delete_user(user_id: int):
 
 @app.route("/toggle_user/<int:user_id>", methods=["POST"])
 def toggle_user(user_id: int):
-    db = get_db()
-    user = db.execute("SELECT active FROM users WHERE id=?", (user_id,)).fetchone()
-    if user:
-        new_status = 0 if user["active"] == 1 else 1
-        db.execute("UPDATE users SET active=? WHERE id=?", (new_status, user_id))
-        db.commit()
+    conn = get_conn()
+    if repository.set_user_active(conn, user_id) is not None:
+        conn.commit()
     return redirect(url_for("admin_users"))
 
 
 @app.route('/deactivate_user/<int:user_id>', methods=["POST"])
 def deactivate_user(user_id: int):
     """Set the user's `active` flag to 0 (deactivate) and return to manage users."""
-    db = get_db()
-    user = db.execute("SELECT id FROM users WHERE id=?", (user_id,)).fetchone()
-    if user:
-        db.execute("UPDATE users SET active=0 WHERE id=?", (user_id,))
-        db.commit()
-        # Try to show which user was deactivated by fetching their user_id
-        row = db.execute("SELECT user_id FROM users WHERE id=?", (user_id,)).fetchone()
-        if row:
-            flash(f"User '{row['user_id']}' deactivated.")
+    conn = get_conn()
+    user = repository.set_user_active(conn, user_id, False)
+    if user is not None:
+        conn.commit()
+        flash(f"User '{user.user_id}' deactivated.")
     return redirect(url_for("admin_users"))
 
 
 @app.route('/reactivate_user/<int:user_id>', methods=["POST"])
 def reactivate_user(user_id: int):
     """Reactivate a previously deactivated user and return to inactive users list."""
-    db = get_db()
-    user = db.execute("SELECT user_id FROM users WHERE id=?", (user_id,)).fetchone()
-    if user:
-        db.execute("UPDATE users SET active=1 WHERE id=?", (user_id,))
-        db.commit()
-        flash(f"User '{user['user_id']}' reactivated.")
+    conn = get_conn()
+    user = repository.set_user_active(conn, user_id, True)
+    if user is not None:
+        conn.commit()
+        flash(f"User '{user.user_id}' reactivated.")
     return redirect(url_for('admin_inactive_users'))
 
 
@@ -440,60 +516,94 @@ def logout():
     return redirect(url_for("homepage"))
 
 
+def _flag_near_duplicates(db: sqlite3.Connection, question_id) -> None:
+    """Index the submitted question and warn the admin about near-duplicates."""
+    siblings = similarity_index.index_question(db, int(question_id), similarity_index.question_text(request.form))
+    if siblings:
+        flash(f"⚠ Question looks like a near-duplicate of question(s) {', '.join(map(str, siblings))}; "
+              "they will not be put on the same paper.")
+
+
 @app.route("/admin/questions", methods=["GET", "POST"])
 def admin_questions():
     if not flask_session.get("is_admin"):
         return redirect(url_for("admin_login"))
 
     db = get_db()
+    conn = get_conn()
 
     if request.method == "POST":
         action = request.form.get("action")
+        fields = {k: request.form.get(k, "").strip() for k in repository.QUESTION_FIELDS}
 
+        # the edit, its index entries and the new snapshot commit together
         if action == "add":
-            db.execute(
-                """
-                INSERT INTO questions (question, option_a, option_b, option_c, option_d, correct_option)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    request.form.get("question", "").strip(),
-                    request.form.get("option_a", "").strip(),
-                    request.form.get("option_b", "").strip(),
-                    request.form.get("option_c", "").strip(),
-                    request.form.get("option_d", "").strip(),
-                    request.form.get("correct_option", ""),
-                ),
-            )
-            db.commit()
+            _flag_near_duplicates(db, repository.add_question(conn, fields))
+            bank_snapshots.publish_snapshot(db)
+            conn.commit()
 
         elif action == "delete":
-            qid = request.form.get("delete_id")
-            db.execute("DELETE FROM questions WHERE id=?", (qid,))
-            db.commit()
+            # as for edits: a blank, non-numeric or unknown id changes nothing
+            qid = request.form.get("delete_id", type=int)
+            if qid is not None and repository.delete_question(conn, qid):
+                similarity_index.remove_question(db, qid)
+                bank_snapshots.publish_snapshot(db)
+                conn.commit()
 
         elif action == "edit":
-            qid = request.form.get("edit_id")
-            db.execute(
-                """
-                UPDATE questions
-                SET question=?, option_a=?, option_b=?, option_c=?, option_d=?, correct_option=?
-                WHERE id=?
-                """,
-                (
-                    request.form.get("question", "").strip(),
-                    request.form.get("option_a", "").strip(),
-                    request.form.get("option_b", "").strip(),
-                    request.form.get("option_c", "").strip(),
-                    request.form.get("option_d", "").strip(),
-                    request.form.get("correct_option", ""),
-                    qid,
-                ),
-            )
-            db.commit()
+            # None for a blank or non-numeric id; an unknown id updates nothing
+            qid = request.form.get("edit_id", type=int)
+            if qid is not None and repository.update_question(conn, qid, fields):
+                _flag_near_duplicates(db, qid)
+                bank_snapshots.publish_snapshot(db)
+                conn.commit()
+
+    return render_template("admin_questions.html", questions=repository.list_questions(conn))
+
+
+# --- Edge sync (central side) ---
+@app.route("/sync/snapshot")
+def sync_snapshot():
+    """Serve the signed question bank to edge nodes that hold the sync key."""
+    if NODE_ROLE != "central":
+        return "Not a central node", 404
+    try:
+        # the snapshot includes every correct option: only edge nodes may fetch it
+        edge_sync.verify_request(
+            request.path,
+            request.headers.get(edge_sync.TIMESTAMP_HEADER, ""),
+            request.headers.get(edge_sync.SIGNATURE_HEADER, ""),
+        )
+    except edge_sync.SyncError as exc:
+        return str(exc), 403
+    try:
+        # may publish the first snapshot; nothing else has begun a transaction yet
+        with get_conn().begin():
+            blob = edge_sync.export_snapshot(get_db())
+        signature = edge_sync.sign(blob)
+    except edge_sync.SyncError as exc:
+        return str(exc), 503
+    return blob, 200, {"Content-Type": "application/octet-stream", edge_sync.SIGNATURE_HEADER: signature}
+
+
+@app.route("/sync/batch", methods=["POST"])
+def sync_batch():
+    """Accept a signed, compressed batch of finished attempts from an edge node."""
+    if NODE_ROLE != "central":
+        return "Not a central node", 404
+    blob = request.get_data()
+    try:
+        edge_sync.verify(blob, request.headers.get(edge_sync.SIGNATURE_HEADER, ""))
+        with get_conn().begin():
+            summary = edge_sync.apply_batch(get_db(), blob)
+    except edge_sync.SyncError as exc:
+        return {"error": str(exc)}, 400
+    return summary
 
-    questions = db.execute("SELECT * FROM questions ORDER BY id DESC").fetchall()
-    return render_template("admin_questions.html", questions=questions)
+
+if _HAS_FLASK_WTF and CSRFProtect is not None:
+    # Edge nodes authenticate with an HMAC signature instead of a form token
+    csrf.exempt(sync_batch)
 
 
 # --- Must be last. DO NOT TOUCH! ---
@@ -0,0 +1,279 @@
+"""Archive finished exam cycles out of the hot database and keep it tidy.
+
+An exam cycle is a labelled date range of submitted attempts (for example a
+promotion round). Archiving a cycle moves its `sessions` and `scorecards`
+rows, and the `answers` rows of candidates whose latest attempt is in the
+cycle, into a separate SQLite file under `archive/`, so `cbt.db` only holds
+recent data.
+
+Maintenance runs incremental VACUUM and ANALYZE. The app runs it on a
+background thread at most once per `MAINTENANCE_INTERVAL`; it can also be
+run from cron / Task Scheduler. Converting an existing database to
+incremental auto-vacuum needs one full VACUUM, which is only done by
+`maintain --convert` because it locks the database while it runs.
+
+Audits open the hot database and every archive read-only and expose
+`all_sessions` / `all_answers` views across them.
+
+Usage:
+    python archive.py archive 2026-H1 --start 2026-01-01 --end 2026-07-01
+    python archive.py maintain [--convert]
+    python archive.py audit "SELECT cycle, COUNT(*) FROM all_sessions GROUP BY cycle"
+"""
+
+from pathlib import Path
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import List, Optional
+
+from init_db import ensure_runtime_schema
+
+
+DB_PATH = Path(os.environ.get("CBT_DATABASE", "cbt.db"))
+ARCHIVE_DIR = Path(os.environ.get("CBT_ARCHIVE_DIR", "archive"))
+MAINTENANCE_INTERVAL = 6 * 60 * 60  # seconds
+VACUUM_PAGES = 2000  # free pages released per incremental vacuum run
+MAX_ATTACHED = 9  # SQLite's default limit is 10 attached databases
+
+SESSION_COLUMNS = "id, user_id, question_ids, answers, score, started_at, submitted_at, snapshot_id, answer_times"
+
+ARCHIVE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS arc.sessions (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    question_ids TEXT NOT NULL,
+    answers TEXT,
+    score INTEGER,
+    started_at TEXT,
+    submitted_at TEXT,
+    snapshot_id INTEGER,
+    answer_times TEXT
+);
+CREATE INDEX IF NOT EXISTS arc.idx_sessions_user ON sessions(user_id);
+
+CREATE TABLE IF NOT EXISTS arc.scorecards (
+    session_id INTEGER PRIMARY KEY,
+    snapshot_id INTEGER,
+    payload BLOB NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS arc.answers (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    selected_option TEXT NOT NULL,
+    session_id INTEGER NOT NULL,
+    answered_at REAL
+);
+"""
+
+# Columns added after the first archives were written, by table
+ARCHIVE_COLUMNS = {
+    "sessions": {"answer_times": "TEXT"},
+    "answers": {"answered_at": "REAL"},
+}
+
+
+def _archive_path(label: str, directory: Path = ARCHIVE_DIR) -> Path:
+    if not re.fullmatch(r"[A-Za-z0-9_.-]+", label):
+        raise ValueError(f"invalid cycle label: {label!r}")
+    return directory / f"cbt-{label}.db"
+
+
+def archive_cycle(conn: sqlite3.Connection, label: str, start: str, end: str,
+                  directory: Path = ARCHIVE_DIR) -> int:
+    """Move sessions submitted in [start, end) into the cycle's archive file.
+
+    Returns the number of sessions moved. Attempts still in progress
+    (`submitted_at IS NULL`) are never archived. Run this on the central
+    server only: edge nodes must upload attempts before they are archived.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    path = _archive_path(label, directory)
+    conn.execute("ATTACH DATABASE ? AS arc", (str(path),))
+    try:
+        conn.executescript(ARCHIVE_SCHEMA_SQL)
+        for table, columns in ARCHIVE_COLUMNS.items():
+            # archive created before answer timestamps were recorded
+            existing = {r[1] for r in conn.execute(f"PRAGMA arc.table_info({table})")}
+            for name, decl in columns.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE arc.{table} ADD COLUMN {name} {decl}")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                """
+                CREATE TEMP TABLE archiving AS
+                SELECT id, user_id FROM main.sessions
+                WHERE submitted_at IS NOT NULL AND submitted_at >= ? AND submitted_at < ?
+                """,
+                (start, end),
+            )
+            moved = conn.execute("SELECT COUNT(*) FROM archiving").fetchone()[0]
+            conn.execute(
+                f"INSERT INTO arc.sessions ({SESSION_COLUMNS}) "
+                f"SELECT {SESSION_COLUMNS} FROM main.sessions WHERE id IN (SELECT id FROM archiving)"
+            )
+            conn.execute(
+                "INSERT INTO arc.scorecards SELECT * FROM main.scorecards "
+                "WHERE session_id IN (SELECT id FROM archiving)"
+            )
+            conn.execute("DELETE FROM main.scorecards WHERE session_id IN (SELECT id FROM archiving)")
+            # `answers` holds the working copy of a candidate's latest attempt;
+            # it belongs to the cycle only if that attempt is being archived
+            conn.execute(
+                """
+                CREATE TEMP TABLE archiving_users AS
+                SELECT a.user_id, a.id AS session_id FROM archiving a
+                WHERE a.id = (SELECT MAX(s.id) FROM main.sessions s WHERE s.user_id = a.user_id)
+                """
+            )
+            conn.execute(
+                """
+                INSERT INTO arc.answers (user_id, question_id, selected_option, session_id, answered_at)
+                SELECT an.user_id, an.question_id, an.selected_option, au.session_id, an.answered_at
+                FROM main.answers an JOIN archiving_users au ON au.user_id = an.user_id
+                """
+            )
+            conn.execute("DELETE FROM main.answers WHERE user_id IN (SELECT user_id FROM archiving_users)")
+            conn.execute("DELETE FROM main.sessions WHERE id IN (SELECT id FROM archiving)")
+            conn.execute(
+                """
+                INSERT INTO archive_cycles (label, filename, start_date, end_date, session_count, archived_at)
+                VALUES (?, ?, ?, ?, ?, datetime('now'))
+                ON CONFLICT(label) DO UPDATE SET session_count = session_count + excluded.session_count,
+                                                 archived_at = excluded.archived_at
+                """,
+                (label, path.name, start, end, moved),
+            )
+            conn.execute("DROP TABLE temp.archiving")
+            conn.execute("DROP TABLE temp.archiving_users")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute("DETACH DATABASE arc")
+    return moved
+
+
+# --- Maintenance ---
+def run_maintenance(conn: sqlite3.Connection, convert: bool = False) -> None:
+    """Release free pages and refresh planner statistics."""
+    if convert and conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
+    conn.execute("ANALYZE")
+    conn.execute("INSERT INTO maintenance_log (task, ran_at) VALUES ('vacuum+analyze', datetime('now'))")
+    conn.commit()
+
+
+def maintenance_due(conn: sqlite3.Connection, interval: int = MAINTENANCE_INTERVAL) -> bool:
+    row = conn.execute(
+        "SELECT (julianday('now') - julianday(MAX(ran_at))) * 86400 FROM maintenance_log"
+    ).fetchone()
+    return row[0] is None or row[0] >= interval
+
+
+def start_maintenance_scheduler(db_path: Path, interval: int = MAINTENANCE_INTERVAL) -> threading.Thread:
+    """Run `run_maintenance()` whenever it is due, checking once a minute.
+
+    Every worker runs a scheduler; checking `maintenance_log` first keeps the
+    work to roughly once per interval however many workers there are.
+    """
+    def _loop():
+        conn = sqlite3.connect(db_path, timeout=30)
+        while True:
+            time.sleep(60)
+            try:
+                if maintenance_due(conn, interval):
+                    run_maintenance(conn)
+            except sqlite3.OperationalError as exc:
+                print(f"⚠ Database maintenance deferred: {exc}", file=sys.stderr)
+
+    thread = threading.Thread(target=_loop, name="db-maintenance", daemon=True)
+    thread.start()
+    return thread
+
+
+# --- Read-only audits across archives ---
+def open_audit_connection(db_path: Path = DB_PATH, directory: Path = ARCHIVE_DIR,
+                          cycles: Optional[List[str]] = None) -> sqlite3.Connection:
+    """Open the hot database and its archives read-only.
+
+    `all_sessions` and `all_answers` are temp views with a leading `cycle`
+    column ('current' for the hot database). Pass `cycles` to limit which
+    archives are attached when there are more than SQLite allows.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute("SELECT label, filename FROM archive_cycles ORDER BY label").fetchall()
+    if cycles is not None:
+        rows = [r for r in rows if r["label"] in cycles]
+    if len(rows) > MAX_ATTACHED:
+        conn.close()
+        raise ValueError(f"{len(rows)} archives exceed the attach limit; pass `cycles` to choose")
+
+    session_parts = [f"SELECT 'current' AS cycle, {SESSION_COLUMNS} FROM main.sessions"]
+    answer_parts = [
+        "SELECT 'current' AS cycle, an.user_id, an.question_id, an.selected_option, "
+        "(SELECT MAX(s.id) FROM main.sessions s WHERE s.user_id = an.user_id) AS session_id, "
+        "an.answered_at FROM main.answers an"
+    ]
+    for n, row in enumerate(rows):
+        alias = f"arc{n}"
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (f"file:{directory / row['filename']}?mode=ro",))
+        label = row["label"].replace("'", "''")
+        session_parts.append(f"SELECT '{label}', {SESSION_COLUMNS} FROM {alias}.sessions")
+        # read-only here, so archives written before `answered_at` existed read it as NULL
+        has_time = "answered_at" in {r[1] for r in conn.execute(f"PRAGMA {alias}.table_info(answers)")}
+        answer_parts.append(
+            f"SELECT '{label}', user_id, question_id, selected_option, session_id, "
+            f"{'answered_at' if has_time else 'NULL'} FROM {alias}.answers"
+        )
+    conn.execute(f"CREATE TEMP VIEW all_sessions AS {' UNION ALL '.join(session_parts)}")
+    conn.execute(f"CREATE TEMP VIEW all_answers AS {' UNION ALL '.join(answer_parts)}")
+    return conn
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Exam-cycle archival and database maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    arc = sub.add_parser("archive", help="move a finished exam cycle to its archive file")
+    arc.add_argument("label")
+    arc.add_argument("--start", required=True, help="first submission date (inclusive), YYYY-MM-DD")
+    arc.add_argument("--end", required=True, help="last submission date (exclusive), YYYY-MM-DD")
+    mnt = sub.add_parser("maintain", help="incremental VACUUM and ANALYZE")
+    mnt.add_argument("--convert", action="store_true", help="switch to incremental auto-vacuum (full VACUUM)")
+    aud = sub.add_parser("audit", help="run a read-only query across the hot database and archives")
+    aud.add_argument("sql")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args()
+
+    if args.command == "audit":
+        conn = open_audit_connection(args.db)
+        for row in conn.execute(args.sql):
+            print(tuple(row))
+        conn.close()
+        return
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    ensure_runtime_schema(conn)
+    if args.command == "archive":
+        moved = archive_cycle(conn, args.label, args.start, args.end)
+        print(f"✅ Archived {moved} sessions to {_archive_path(args.label)}")
+    else:
+        run_maintenance(conn, convert=args.convert)
+        print("✅ Maintenance complete")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
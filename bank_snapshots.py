@@ -0,0 +1,336 @@
+"""Immutable, versioned snapshots of the question bank.
+
+Edits through the admin page change the live `questions` table, but every
+exam attempt is pinned to the snapshot that was current when the candidate
+logged in, so a question edited or deleted mid-exam no longer breaks the
+paper or changes how it is scored.
+
+Each snapshot is a read-only binary file that workers open with `mmap`, so
+all processes on a host share the same page-cache copy:
+
+    header   b"CBTSNAP1", uint32 question count
+    index    int64 question ids (sorted), uint64 record offsets
+    records  correct option (uint8) + 5 strings (uint32 length + UTF-8)
+
+Publishing writes the file under a temporary name, fsyncs it, renames it into
+place and only then inserts the `bank_snapshots` row, so a reader sees
+either the old snapshot or the complete new one. Files are named after their
+content hash and never rewritten, which keeps old papers readable.
+
+Each process keeps the most recently used snapshots open (MAX_OPEN). Old
+files are not removed automatically; `prune` deletes the ones no longer
+needed to show or score an attempt.
+
+Usage:
+    python bank_snapshots.py prune [--dry-run]
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+import argparse
+import bisect
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+
+DB_PATH = Path(os.environ.get("CBT_DATABASE", "cbt.db"))
+SNAPSHOT_DIR = Path(os.environ.get("CBT_SNAPSHOT_DIR", "snapshots"))
+MAGIC = b"CBTSNAP1"
+MAX_OPEN = 8  # snapshots kept mapped per process, least recently used dropped first
+
+TEXT_FIELDS = ("question", "option_a", "option_b", "option_c", "option_d")
+OPTION_CODES = ("option_a", "option_b", "option_c", "option_d")
+QUESTION_COLUMNS = ("id",) + TEXT_FIELDS + ("correct_option",)
+
+_HEADER = struct.Struct("<8sI")
+_LENGTH = struct.Struct("<I")
+
+
+def option_code(value: Optional[str]) -> int:
+    """1-4 for option_a..option_d, 0 for anything else.
+
+    Unknown values (legacy 'A'..'D' rows, typos) keep scoring as unanswerable.
+    """
+    return OPTION_CODES.index(value) + 1 if value in OPTION_CODES else 0
+
+
+def serialize(rows: List[Tuple]) -> bytes:
+    """Encode (id, question, option_a..d, correct_option) rows into snapshot bytes."""
+    rows = sorted(rows, key=lambda r: r[0])
+    records = bytearray()
+    offsets = []
+    for row in rows:
+        offsets.append(len(records))
+        records.append(option_code(row[6]))
+        for text in row[1:6]:
+            data = (text or "").encode("utf-8")
+            records += _LENGTH.pack(len(data))
+            records += data
+
+    count = len(rows)
+    records_start = _HEADER.size + count * 16
+    return b"".join((
+        _HEADER.pack(MAGIC, count),
+        struct.pack(f"<{count}q", *(r[0] for r in rows)),
+        struct.pack(f"<{count}Q", *(records_start + o for o in offsets)),
+        bytes(records),
+    ))
+
+
+class BankSnapshot:
+    """Read-only view over one memory-mapped snapshot file."""
+
+    def __init__(self, snapshot_id: int, path: Path):
+        self.snapshot_id = snapshot_id
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a question-bank snapshot")
+        view = memoryview(self._mm)
+        ids_end = _HEADER.size + self.count * 8
+        self._ids = view[_HEADER.size:ids_end].cast("q")
+        self._offsets = view[ids_end:ids_end + self.count * 8].cast("Q")
+
+    def ids(self) -> List[int]:
+        return self._ids.tolist()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, question_id: int) -> bool:
+        return self._find(question_id) is not None
+
+    def _find(self, question_id: int) -> Optional[int]:
+        pos = bisect.bisect_left(self._ids, question_id)
+        if pos < self.count and self._ids[pos] == question_id:
+            return pos
+        return None
+
+    def _read(self, pos: int) -> Dict:
+        offset = self._offsets[pos]
+        question = {"id": self._ids[pos]}
+        code = self._mm[offset]
+        offset += 1
+        for field in TEXT_FIELDS:
+            (length,) = _LENGTH.unpack_from(self._mm, offset)
+            offset += _LENGTH.size
+            question[field] = self._mm[offset:offset + length].decode("utf-8")
+            offset += length
+        question["correct_option"] = OPTION_CODES[code - 1] if code else ""
+        return question
+
+    def get(self, question_id: int) -> Optional[Dict]:
+        """Return the question as a dict (same keys as a `questions` row)."""
+        pos = self._find(int(question_id))
+        return None if pos is None else self._read(pos)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for pos in range(self.count):
+            yield self._read(pos)
+
+
+# Per-process LRU of open snapshots; they are immutable so never invalidated.
+# An evicted snapshot is not closed: requests still holding it keep reading,
+# and the mapping is released once the last reference goes.
+_open_snapshots: "OrderedDict[int, BankSnapshot]" = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def load_snapshot(conn: sqlite3.Connection, snapshot_id: int,
+                  directory: Path = SNAPSHOT_DIR) -> BankSnapshot:
+    with _open_lock:
+        snap = _open_snapshots.get(snapshot_id)
+        if snap is not None:
+            _open_snapshots.move_to_end(snapshot_id)
+            return snap
+    row = conn.execute("SELECT filename FROM bank_snapshots WHERE id=?", (snapshot_id,)).fetchone()
+    if row is None:
+        raise LookupError(f"question-bank snapshot {snapshot_id} does not exist")
+    with _open_lock:
+        snap = _open_snapshots.get(snapshot_id)
+        if snap is None:
+            snap = BankSnapshot(snapshot_id, directory / row[0])
+            _open_snapshots[snapshot_id] = snap
+            while len(_open_snapshots) > MAX_OPEN:
+                _open_snapshots.popitem(last=False)
+    return snap
+
+
+def live_questions(conn: sqlite3.Connection, question_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+    """Rows of the live `questions` table by id (all of them by default),
+    shaped like the dicts a snapshot returns."""
+    sql = f"SELECT {', '.join(QUESTION_COLUMNS)} FROM questions"
+    params: List[int] = []
+    if question_ids is not None:
+        params = list(question_ids)
+        sql += f" WHERE id IN ({', '.join('?' for _ in params)})"
+    return {r[0]: dict(zip(QUESTION_COLUMNS, r)) for r in conn.execute(sql, params)}
+
+
+def paper_questions(conn: sqlite3.Connection, snapshot_id: Optional[int], question_ids: Iterable[int],
+                    live: Optional[Mapping[int, Dict]] = None) -> Dict[int, Dict]:
+    """The questions of an attempt's paper, by id in paper order.
+
+    Each comes from the attempt's snapshot, or from the live table when the
+    snapshot lacks it or the attempt has none (recorded before snapshots, or
+    synced from an edge node whose snapshot is unknown here). Questions found
+    in neither are left out. Callers going through many attempts pass `live`
+    from `live_questions()` so the table is read once.
+    """
+    snapshot = None
+    if snapshot_id is not None:
+        try:
+            snapshot = load_snapshot(conn, snapshot_id)
+        except (LookupError, OSError):
+            snapshot = None
+    paper = {qid: snapshot.get(qid) if snapshot is not None else None for qid in question_ids}
+    missing = [qid for qid, question in paper.items() if question is None]
+    if missing:
+        if live is None:
+            live = live_questions(conn, missing)
+        for qid in missing:
+            paper[qid] = live.get(qid)
+    return {qid: question for qid, question in paper.items() if question is not None}
+
+
+def current_snapshot_id(conn: sqlite3.Connection) -> Optional[int]:
+    row = conn.execute("SELECT MAX(id) FROM bank_snapshots").fetchone()
+    return row[0] if row else None
+
+
+_publish_lock = threading.Lock()
+
+
+def _write_file(path: Path, blob: bytes) -> None:
+    # a unique temp name: concurrent publishers must not share one
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(blob)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def publish_snapshot(conn: sqlite3.Connection, directory: Path = SNAPSHOT_DIR) -> int:
+    """Freeze the live `questions` table into a new snapshot and return its id.
+
+    Publishing an unchanged bank returns the current snapshot id instead of
+    creating a duplicate version. Publishers in one process take turns; the
+    row insert is guarded so another process cannot add the same version twice.
+    The caller commits, together with the question edits being published.
+    """
+    rows = conn.execute(
+        "SELECT id, question, option_a, option_b, option_c, option_d, correct_option FROM questions"
+    ).fetchall()
+    blob = serialize([tuple(r) for r in rows])
+    checksum = hashlib.sha256(blob).hexdigest()
+
+    with _publish_lock:
+        # checked under the lock: another thread may just have published this bank
+        current = conn.execute(
+            "SELECT id, checksum FROM bank_snapshots ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        if current and current[1] == checksum:
+            return current[0]
+
+        directory.mkdir(parents=True, exist_ok=True)
+        filename = f"bank-{checksum[:16]}.snap"
+        final_path = directory / filename
+        if not final_path.exists():
+            _write_file(final_path, blob)
+
+        conn.execute(
+            """
+            INSERT INTO bank_snapshots (filename, checksum, question_count, created_at)
+            SELECT ?, ?, ?, datetime('now')
+            WHERE NOT EXISTS (
+                SELECT 1 FROM bank_snapshots
+                WHERE id = (SELECT MAX(id) FROM bank_snapshots) AND checksum = ?
+            )
+            """,
+            (filename, checksum, len(rows), checksum),
+        )
+        return current_snapshot_id(conn)
+
+
+def ensure_current_snapshot(conn: sqlite3.Connection, directory: Path = SNAPSHOT_DIR) -> int:
+    """Return the current snapshot id, publishing the first one if needed.
+
+    Safe to race: `publish_snapshot` re-checks under its lock, so concurrent
+    first logins end up with one snapshot.
+    """
+    snapshot_id = current_snapshot_id(conn)
+    if snapshot_id is None:
+        snapshot_id = publish_snapshot(conn, directory)
+    return snapshot_id
+
+
+def prune_snapshots(conn: sqlite3.Connection, directory: Path = SNAPSHOT_DIR,
+                    dry_run: bool = False) -> List[Path]:
+    """Delete snapshot files that no attempt still needs; returns the files removed.
+
+    Kept: the current snapshot, those of attempts still in progress, and those
+    of finished attempts without a stored scorecard (e.g. synced from an edge
+    node), which are scored from their snapshot. The `bank_snapshots` rows
+    stay as the record of each version; loading a pruned one raises OSError.
+    """
+    keep = {r[0] for r in conn.execute(
+        """
+        SELECT b.filename FROM bank_snapshots b
+        WHERE b.id = (SELECT MAX(id) FROM bank_snapshots)
+           OR b.id IN (
+               SELECT s.snapshot_id FROM sessions s
+               LEFT JOIN scorecards c ON c.session_id = s.id
+               WHERE s.submitted_at IS NULL OR c.session_id IS NULL
+           )
+        """
+    )}
+    removed = []
+    for path in sorted(directory.glob("bank-*.snap")):
+        if path.name in keep:
+            continue
+        if not dry_run:
+            path.unlink()
+        removed.append(path)
+    if not dry_run:
+        with _open_lock:
+            for snapshot_id, snap in list(_open_snapshots.items()):
+                if snap.path in removed:
+                    del _open_snapshots[snapshot_id]
+    return removed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from init_db import ensure_runtime_schema
+
+    parser = argparse.ArgumentParser(description="Question-bank snapshot housekeeping")
+    parser.add_argument("command", choices=["prune"])
+    parser.add_argument("--dry-run", action="store_true", help="list the files that would be removed")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--dir", type=Path, default=SNAPSHOT_DIR)
+    args = parser.parse_args(argv)
+
+    with sqlite3.connect(args.db) as conn:
+        ensure_runtime_schema(conn)
+        removed = prune_snapshots(conn, args.dir, args.dry_run)
+    for path in removed:
+        print(f"   {path.name}")
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"✅ {verb} {len(removed)} unused snapshot file(s) from {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
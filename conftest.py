@@ -0,0 +1,71 @@
+"""Shared pytest fixtures for the in-process tests.
+
+`cbt_env` gives a test its own copy of cbt.db, with snapshots, the answer
+journal, archives and scorecards in the same temp folder, and re-imports the
+app modules so they pick up those `CBT_*` settings (most of them read their
+paths at import time). Settings and modules are restored after the test.
+"""
+import importlib
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+DB = Path(__file__).resolve().parent / 'cbt.db'
+
+# modules that read CBT_* settings at import time
+APP_MODULES = ('app', 'repository', 'bank_snapshots', 'answer_journal', 'archive', 'edge_sync',
+               'scorecards', 'scorecard_batch', 'similarity_index', 'init_db', 'adaptive', 'integrity',
+               'load_seed_questions')
+
+
+class CBTEnv:
+    """A throwaway copy of the project database and the app modules bound to it."""
+
+    def __init__(self, directory: Path, monkeypatch):
+        self.dir = directory
+        self.db = directory / 'cbt.db'
+        self._monkeypatch = monkeypatch
+        shutil.copy(DB, self.db)
+        self.setenv(
+            CBT_DATABASE=str(self.db),
+            CBT_SNAPSHOT_DIR=str(directory / 'snapshots'),
+            CBT_JOURNAL_DIR=str(directory / 'journal'),
+            CBT_ARCHIVE_DIR=str(directory / 'archive'),
+            CBT_SCORECARD_DIR=str(directory / 'scorecards'),
+        )
+
+    def setenv(self, **settings: str) -> None:
+        """Change CBT_* settings; modules imported afterwards see the new values."""
+        for name, value in settings.items():
+            self._monkeypatch.setenv(name, value)
+        for name in APP_MODULES:
+            self._monkeypatch.delitem(sys.modules, name, raising=False)
+
+    def module(self, name: str):
+        return importlib.import_module(name)
+
+    def app(self):
+        app = self.module('app').app
+        app.config['WTF_CSRF_ENABLED'] = False
+        return app
+
+    def connect(self, path=None) -> sqlite3.Connection:
+        """Autocommit connection to the copy (or `path`) with the runtime schema in place."""
+        conn = sqlite3.connect(path or self.db, isolation_level=None)
+        self.module('init_db').ensure_runtime_schema(conn)
+        return conn
+
+    def query(self, sql: str, params=(), path=None):
+        conn = sqlite3.connect(path or self.db)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+
+@pytest.fixture
+def cbt_env(tmp_path, monkeypatch) -> CBTEnv:
+    return CBTEnv(tmp_path, monkeypatch)
@@ -0,0 +1,358 @@
+"""Synchronise an exam-centre edge node with the central CBT server.
+
+An edge node is an ordinary instance of `app.py` started with
+`CBT_NODE_ROLE=edge` and its own SQLite file (`CBT_DATABASE`). It keeps a
+signed copy of the central question bank and its own users, records attempts
+in its local `sessions` table and uploads the finished ones to the central
+server in compressed batches whenever the WAN link is available.
+
+Both directions are signed with HMAC-SHA256 using the shared secret in
+`CBT_SYNC_KEY`. The snapshot contains the answer key, so the edge must also
+prove it holds the key to download it: it signs the current time, and the
+central server refuses requests whose signature or timestamp does not check.
+
+Batches are idempotent: the batch id is a hash of the payload and every
+uploaded session is keyed by (node id, edge session id), so a batch that is
+retried after a dropped connection is applied at most once. Sessions held
+back by a user id conflict are offered again on the next push; they do not
+stop newer sessions from being uploaded.
+
+Usage (from the edge node's project directory):
+    python edge_sync.py init --central http://central:5000
+    python edge_sync.py pull --central http://central:5000
+    python edge_sync.py push --central http://central:5000
+"""
+
+from pathlib import Path
+import argparse
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+from bank_snapshots import ensure_current_snapshot, load_snapshot, publish_snapshot
+from init_db import ensure_runtime_schema, init_db, seed_users
+import similarity_index
+
+
+DB_PATH = Path(os.environ.get("CBT_DATABASE", "cbt.db"))
+SIGNATURE_HEADER = "X-CBT-Signature"
+NODE_HEADER = "X-CBT-Node"
+TIMESTAMP_HEADER = "X-CBT-Timestamp"
+MAX_CLOCK_SKEW = 300  # seconds an authenticated snapshot request stays valid
+DEFAULT_BATCH_SIZE = 500
+
+QUESTION_COLUMNS = ("id", "question", "option_a", "option_b", "option_c", "option_d", "correct_option")
+SESSION_COLUMNS = ("id", "user_id", "question_ids", "answers", "score", "started_at", "submitted_at", "answer_times")
+
+
+class SyncError(Exception):
+    """Raised when a snapshot or batch cannot be verified or applied."""
+
+
+# --- Signing helpers ---
+def sync_key() -> bytes:
+    """Return the shared HMAC key, refusing to run without one."""
+    key = os.environ.get("CBT_SYNC_KEY", "")
+    if not key:
+        raise SyncError("CBT_SYNC_KEY is not set; edge sync requires a shared key")
+    return key.encode("utf-8")
+
+
+def sign(blob: bytes, key: Optional[bytes] = None) -> str:
+    return hmac.new(key or sync_key(), blob, hashlib.sha256).hexdigest()
+
+
+def verify(blob: bytes, signature: str, key: Optional[bytes] = None) -> None:
+    if not signature or not hmac.compare_digest(sign(blob, key), signature):
+        raise SyncError("signature mismatch")
+
+
+def _auth_message(path: str, timestamp: str) -> bytes:
+    return f"GET {path} {timestamp}".encode("utf-8")
+
+
+def auth_headers(path: str, key: Optional[bytes] = None) -> Dict[str, str]:
+    """Headers proving the caller holds the sync key, for a GET of `path`."""
+    timestamp = str(int(time.time()))
+    return {TIMESTAMP_HEADER: timestamp, SIGNATURE_HEADER: sign(_auth_message(path, timestamp), key)}
+
+
+def verify_request(path: str, timestamp: str, signature: str, key: Optional[bytes] = None) -> None:
+    """Check `auth_headers()` sent by an edge node; raises SyncError if invalid or stale."""
+    try:
+        skew = abs(time.time() - int(timestamp))
+    except (TypeError, ValueError):
+        raise SyncError("missing or malformed timestamp") from None
+    if skew > MAX_CLOCK_SKEW:
+        raise SyncError("request timestamp is too far from the server clock")
+    verify(_auth_message(path, timestamp), signature, key)
+
+
+def _pack(payload: Dict) -> bytes:
+    raw = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    # mtime=0 keeps the compressed bytes deterministic for identical payloads
+    return gzip.compress(raw, mtime=0)
+
+
+def _unpack(blob: bytes) -> Dict:
+    try:
+        return json.loads(gzip.decompress(blob).decode("utf-8"))
+    except (OSError, ValueError) as exc:
+        raise SyncError(f"malformed payload: {exc}") from exc
+
+
+# --- Question-bank snapshot (central -> edge) ---
+def export_snapshot(conn: sqlite3.Connection) -> bytes:
+    """Serialise the current question-bank snapshot, keeping question ids stable."""
+    snapshot_id = ensure_current_snapshot(conn)
+    checksum = conn.execute("SELECT checksum FROM bank_snapshots WHERE id=?", (snapshot_id,)).fetchone()[0]
+    rows = [[q[c] for c in QUESTION_COLUMNS] for q in load_snapshot(conn, snapshot_id)]
+    return _pack({"checksum": checksum, "questions": rows})
+
+
+def import_snapshot(conn: sqlite3.Connection, blob: bytes) -> int:
+    """Replace the local question bank with a verified snapshot.
+
+    Ids are kept as-is and the snapshot is republished locally, which yields
+    a byte-identical file, so attempts recorded on the edge can be matched to
+    the central snapshot by checksum once they are uploaded.
+    """
+    payload = _unpack(blob)
+    rows = payload.get("questions") or []
+    placeholders = ", ".join("?" for _ in QUESTION_COLUMNS)
+    ensure_runtime_schema(conn)
+    with conn:
+        conn.execute("DELETE FROM questions")
+        conn.executemany(
+            f"INSERT INTO questions ({', '.join(QUESTION_COLUMNS)}) VALUES ({placeholders})",
+            rows,
+        )
+    similarity_index.rebuild(conn)
+    snapshot_id = publish_snapshot(conn)
+    checksum = conn.execute("SELECT checksum FROM bank_snapshots WHERE id=?", (snapshot_id,)).fetchone()[0]
+    if payload.get("checksum") and checksum != payload["checksum"]:
+        raise SyncError("imported snapshot does not match the central checksum")
+    return len(rows)
+
+
+# --- Attempt batches (edge -> central) ---
+def build_batch(conn: sqlite3.Connection, node_id: str, limit: int = DEFAULT_BATCH_SIZE,
+                after_id: int = 0) -> Optional[Dict]:
+    """Collect finished, not yet synced sessions and the users they belong to.
+
+    Only sessions with an id above `after_id` are included, so a push can
+    move past sessions the central server held back. Returns None when there
+    is nothing to upload.
+    """
+    sessions = conn.execute(
+        f"""
+        SELECT {', '.join('s.' + c for c in SESSION_COLUMNS)}, b.checksum
+        FROM sessions s
+        LEFT JOIN bank_snapshots b ON b.id = s.snapshot_id
+        LEFT JOIN synced_sessions ss ON ss.session_id = s.id
+        WHERE s.submitted_at IS NOT NULL AND ss.session_id IS NULL AND s.id > ?
+        ORDER BY s.id
+        LIMIT ?
+        """,
+        (after_id, limit),
+    ).fetchall()
+    if not sessions:
+        return None
+
+    user_ids = sorted({r[1] for r in sessions})
+    placeholders = ", ".join("?" for _ in user_ids)
+    users = conn.execute(
+        f"SELECT user_id, pin, active FROM users WHERE user_id IN ({placeholders}) ORDER BY user_id",
+        user_ids,
+    ).fetchall()
+
+    payload = {
+        "node_id": node_id,
+        "users": [list(u) for u in users],
+        "sessions": [list(s) for s in sessions],
+    }
+    payload["batch_id"] = hashlib.sha256(_pack(payload)).hexdigest()
+    return payload
+
+
+def apply_batch(conn: sqlite3.Connection, blob: bytes) -> Dict:
+    """Apply an uploaded batch on the central server and return a summary.
+
+    A batch id that was already applied returns the stored summary without
+    touching any table. Users whose `user_id` already exists centrally with a
+    different PIN are recorded in `sync_conflicts` and their sessions are held
+    back on the edge until an administrator resolves the clash. The caller
+    commits, so a failed batch leaves nothing behind.
+    """
+    payload = _unpack(blob)
+    batch_id = payload.get("batch_id")
+    node_id = payload.get("node_id")
+    if not batch_id or not node_id:
+        raise SyncError("batch is missing batch_id or node_id")
+
+    seen = conn.execute("SELECT summary FROM sync_batches WHERE batch_id=?", (batch_id,)).fetchone()
+    if seen:
+        summary = json.loads(seen[0])
+        summary["duplicate"] = True
+        return summary
+
+    conflicts: List[str] = []
+    for user_id, pin, active in payload.get("users", []):
+        row = conn.execute("SELECT pin FROM users WHERE user_id=?", (user_id,)).fetchone()
+        if row is None:
+            conn.execute("INSERT INTO users (user_id, pin, active) VALUES (?, ?, ?)", (user_id, pin, active))
+        elif row[0] != pin:
+            conflicts.append(user_id)
+            # retries of a held batch report the same clash; log it once
+            conn.execute(
+                """
+                INSERT INTO sync_conflicts (node_id, user_id, reason, detected_at)
+                SELECT ?, ?, ?, datetime('now')
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM sync_conflicts WHERE node_id=? AND user_id=? AND reason=?
+                )
+                """,
+                (node_id, user_id, "pin mismatch") * 2,
+            )
+
+    accepted: List[int] = []
+    held: List[int] = []
+    for values in payload.get("sessions", []):
+        row = dict(zip(SESSION_COLUMNS + ("snapshot_checksum",), values))
+        if row["user_id"] in conflicts:
+            held.append(row["id"])
+            continue
+        existing = conn.execute(
+            "SELECT session_id FROM sync_sessions WHERE node_id=? AND remote_id=?",
+            (node_id, row["id"]),
+        ).fetchone()
+        if existing is None:
+            snapshot = conn.execute(
+                "SELECT MIN(id) FROM bank_snapshots WHERE checksum=?",
+                (row.get("snapshot_checksum"),),
+            ).fetchone()
+            cur = conn.execute(
+                """
+                INSERT INTO sessions (user_id, question_ids, answers, score, started_at, submitted_at,
+                                      answer_times, snapshot_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (row["user_id"], row["question_ids"], row["answers"], row["score"],
+                 row["started_at"], row["submitted_at"], row["answer_times"], snapshot[0]),
+            )
+            conn.execute(
+                "INSERT INTO sync_sessions (node_id, remote_id, session_id) VALUES (?, ?, ?)",
+                (node_id, row["id"], cur.lastrowid),
+            )
+        accepted.append(row["id"])
+
+    summary = {"batch_id": batch_id, "accepted": accepted, "held": held, "conflicts": conflicts}
+    # A batch with held sessions is not final: the same payload must be
+    # re-applied once the conflict is resolved. Per-session keys in
+    # `sync_sessions` still stop the accepted part being inserted twice.
+    if not conflicts:
+        conn.execute(
+            "INSERT INTO sync_batches (batch_id, node_id, received_at, summary) VALUES (?, ?, datetime('now'), ?)",
+            (batch_id, node_id, json.dumps(summary)),
+        )
+    summary["duplicate"] = False
+    return summary
+
+
+def mark_synced(conn: sqlite3.Connection, summary: Dict) -> None:
+    """Record the sessions the central server accepted so they are not resent."""
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO synced_sessions (session_id, batch_id, synced_at) VALUES (?, ?, datetime('now'))",
+            [(sid, summary["batch_id"]) for sid in summary.get("accepted", [])],
+        )
+
+
+# --- HTTP client used by the edge node ---
+def _request(url: str, data: Optional[bytes] = None, headers: Optional[Dict] = None):
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.read(), resp.headers
+    except urllib.error.HTTPError as exc:
+        raise SyncError(f"{url} returned HTTP {exc.code}: {exc.read()[:200]!r}") from exc
+
+
+def pull_snapshot(central: str, db_path: Path = DB_PATH) -> int:
+    blob, headers = _request(central.rstrip("/") + "/sync/snapshot", headers=auth_headers("/sync/snapshot"))
+    verify(blob, headers.get(SIGNATURE_HEADER, ""))
+    with sqlite3.connect(db_path) as conn:
+        count = import_snapshot(conn, blob)
+    print(f"✅ Imported {count} questions from {central}")
+    return count
+
+
+def push_attempts(central: str, node_id: str, db_path: Path = DB_PATH,
+                  batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Upload all pending sessions in batches; returns the number accepted.
+
+    Sessions held back by a user id conflict are skipped for the rest of the
+    run, so they cannot block newer ones, and are offered again next run.
+    """
+    total = 0
+    after_id = 0
+    with sqlite3.connect(db_path) as conn:
+        ensure_runtime_schema(conn)
+        while True:
+            payload = build_batch(conn, node_id, batch_size, after_id)
+            if payload is None:
+                break
+            after_id = payload["sessions"][-1][0]
+            blob = _pack(payload)
+            body, _ = _request(
+                central.rstrip("/") + "/sync/batch",
+                data=blob,
+                headers={
+                    "Content-Type": "application/octet-stream",
+                    SIGNATURE_HEADER: sign(blob),
+                    NODE_HEADER: node_id,
+                },
+            )
+            summary = json.loads(body.decode("utf-8"))
+            mark_synced(conn, summary)
+            total += len(summary.get("accepted", []))
+            if summary.get("conflicts"):
+                print(f"⚠ User id conflicts held back: {', '.join(summary['conflicts'])}", file=sys.stderr)
+    print(f"✅ Uploaded {total} attempts to {central}")
+    return total
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["init", "pull", "push"])
+    parser.add_argument("--central", required=True, help="base URL of the central server")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="edge SQLite file")
+    parser.add_argument("--node-id", default=os.environ.get("CBT_NODE_ID", socket.gethostname()))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.command == "init":
+        init_db(args.db)
+        seed_users(args.db)
+        pull_snapshot(args.central, args.db)
+    elif args.command == "pull":
+        pull_snapshot(args.central, args.db)
+    else:
+        push_attempts(args.central, args.node_id, args.db, args.batch_size)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except SyncError as exc:
+        print(f"Sync failed: {exc}", file=sys.stderr)
+        sys.exit(1)
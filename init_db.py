@@ -12,12 +12,18 @@ import sqlite3
 import csv
 import sys
 
+from bank_snapshots import publish_snapshot
+import similarity_index
+
 
 DB_PATH = Path("cbt.db")
 SEED_CSV = Path("seed_questions.csv")
 
 
 SCHEMA_SQL = """
+-- only takes effect on a new database file; see `archive.py maintain --convert`
+PRAGMA auto_vacuum = INCREMENTAL;
+
 DROP TABLE IF EXISTS users;
 CREATE TABLE users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -43,6 +49,7 @@ CREATE TABLE answers (
     user_id TEXT NOT NULL,
     question_id INTEGER NOT NULL,
     selected_option TEXT NOT NULL,
+    answered_at REAL,
     FOREIGN KEY (question_id) REFERENCES questions(id)
 );
 
@@ -56,11 +63,157 @@ CREATE TABLE admins (
 """
 
 
+# Tables that hold exam history, archive, journal and sync bookkeeping. These are never dropped
+# so `ensure_runtime_schema()` can run against an existing `cbt.db` safely.
+RUNTIME_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    question_ids TEXT NOT NULL,
+    answers TEXT,
+    score INTEGER,
+    started_at TEXT,
+    submitted_at TEXT,
+    snapshot_id INTEGER REFERENCES bank_snapshots(id),
+    answer_times TEXT
+);
+
+CREATE TABLE IF NOT EXISTS bank_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    question_count INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_answers_user ON answers(user_id);
+
+CREATE TABLE IF NOT EXISTS archive_cycles (
+    label TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    session_count INTEGER NOT NULL,
+    archived_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS maintenance_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    ran_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS question_signatures (
+    question_id INTEGER PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS question_lsh (
+    band INTEGER NOT NULL,
+    bucket BLOB NOT NULL,
+    question_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_question_lsh_bucket ON question_lsh(band, bucket);
+CREATE INDEX IF NOT EXISTS idx_question_lsh_question ON question_lsh(question_id);
+
+CREATE TABLE IF NOT EXISTS question_siblings (
+    question_id INTEGER NOT NULL,
+    sibling_id INTEGER NOT NULL,
+    PRIMARY KEY (question_id, sibling_id)
+);
+
+CREATE TABLE IF NOT EXISTS integrity_flags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cohort TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    session_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    other_session_id INTEGER,
+    other_user_id TEXT,
+    statistic REAL NOT NULL,
+    detail TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_integrity_flags_cohort ON integrity_flags(cohort);
+
+CREATE TABLE IF NOT EXISTS item_params (
+    question_id INTEGER PRIMARY KEY,
+    a REAL NOT NULL,
+    b REAL NOT NULL,
+    n_responses INTEGER NOT NULL,
+    calibrated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS scorecards (
+    session_id INTEGER PRIMARY KEY,
+    snapshot_id INTEGER,
+    payload BLOB NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS journal_checkpoints (
+    segment TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sync_batches (
+    batch_id TEXT PRIMARY KEY,
+    node_id TEXT NOT NULL,
+    received_at TEXT NOT NULL,
+    summary TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sync_sessions (
+    node_id TEXT NOT NULL,
+    remote_id INTEGER NOT NULL,
+    session_id INTEGER NOT NULL,
+    PRIMARY KEY (node_id, remote_id)
+);
+
+CREATE TABLE IF NOT EXISTS sync_conflicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    node_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    detected_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS synced_sessions (
+    session_id INTEGER PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+"""
+
+# Columns added to runtime tables after they first shipped; older databases
+# get them through ALTER TABLE in `ensure_runtime_schema()`.
+RUNTIME_COLUMNS = {
+    "sessions": {
+        "snapshot_id": "INTEGER REFERENCES bank_snapshots(id)",
+        "answer_times": "TEXT",
+    },
+    "answers": {"answered_at": "REAL"},
+}
+
+
 def init_db(db_path: Path = DB_PATH) -> None:
     """Create the database schema (drops existing tables)."""
     with sqlite3.connect(db_path) as conn:
         cur = conn.cursor()
         cur.executescript(SCHEMA_SQL)
+        ensure_runtime_schema(conn)
+
+
+def ensure_runtime_schema(conn: sqlite3.Connection) -> None:
+    """Create the attempt-history and sync tables if they are missing."""
+    conn.executescript(RUNTIME_SCHEMA_SQL)
+    for table, columns in RUNTIME_COLUMNS.items():
+        existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+        for name, decl in columns.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+    conn.commit()
 
 
 def seed_users(db_path: Path = DB_PATH) -> None:
@@ -118,6 +271,10 @@ def main():
     init_db()
     seed_users()
     load_questions_from_csv()
+    with sqlite3.connect(DB_PATH) as conn:
+        pairs = similarity_index.rebuild(conn)
+        publish_snapshot(conn)
+    print(f"ℹ Near-duplicate question pairs flagged: {pairs}")
     print("✅ Database initialized with demo admin, demo user, and questions from CSV.")
 
 
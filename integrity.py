@@ -0,0 +1,227 @@
+"""Batch integrity analysis of a sitting: answer copying and implausible timing.
+
+A cohort is every attempt submitted in a date range. Its responses are
+loaded into NumPy arrays (attempts x items) and analysed in two passes:
+
+* Pairwise similarity. For every pair of candidates the number of identical
+  *incorrect* answers is compared with the number expected if they answered
+  independently (from how often the cohort chose each wrong option). Pairs
+  whose count is both large and many standard deviations above expectation
+  are flagged; the expectation allows for each candidate's own error rate.
+  The counts are matrix products over one-hot wrong-answer matrices,
+  computed in row blocks so memory stays at BLOCK x attempts.
+* Timing. Per-answer latencies come from the timestamps recorded in
+  `exam()`. Candidates whose median latency is a robust outlier on the fast
+  side, or who answered most questions within a few seconds, are flagged.
+
+Flags are written to `integrity_flags` and listed at /admin/integrity.
+
+Usage:
+    python integrity.py analyse 2026-H1 --start 2026-01-01 --end 2026-07-01
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bank_snapshots import OPTION_CODES, live_questions, option_code, paper_questions
+
+
+DB_PATH = Path(os.environ.get("CBT_DATABASE", "cbt.db"))
+
+BLOCK = 256  # attempts per block in the pairwise pass
+MIN_IDENTICAL_WRONG = 8  # shared wrong answers below this are never flagged
+PAIR_Z = 5.0  # standard deviations above the independent expectation
+TIMING_Z = 3.5  # robust z-score (MAD) of log median latency, fast side
+FAST_SECONDS = 3.0
+FAST_FRACTION = 0.5  # share of answers faster than FAST_SECONDS that is flagged
+MIN_TIMED = 5  # answers with timestamps needed for a timing verdict
+
+
+class Cohort:
+    """Responses of one sitting as aligned arrays."""
+
+    def __init__(self, session_ids: List[int], user_ids: List[str], item_ids: np.ndarray,
+                 codes: np.ndarray, correct: np.ndarray, times: np.ndarray, started: np.ndarray):
+        self.session_ids = session_ids
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.codes = codes      # int8, 0 = not answered, not on the paper or no answer key
+        self.correct = correct  # bool
+        self.times = times      # float64 epoch seconds, NaN when unknown
+        self.started = started  # float64 epoch seconds
+
+
+def load_cohort(conn: sqlite3.Connection, start: str, end: str) -> Cohort:
+    """Load the attempts submitted in [start, end).
+
+    Answers are scored against the attempt's paper (see
+    `bank_snapshots.paper_questions`). Answers to questions found neither in
+    its snapshot nor the live table are left out of the analysis rather than
+    counted as wrong.
+    """
+    live = live_questions(conn)
+    rows = conn.execute(
+        """
+        SELECT id, user_id, question_ids, answers, answer_times, snapshot_id,
+               CAST(strftime('%s', started_at) AS REAL)
+        FROM sessions
+        WHERE submitted_at IS NOT NULL AND submitted_at >= ? AND submitted_at < ?
+        ORDER BY id
+        """,
+        (start, end),
+    ).fetchall()
+
+    item_ids = sorted({q for r in rows for q in json.loads(r[2])})
+    column = {q: i for i, q in enumerate(item_ids)}
+    shape = (len(rows), len(item_ids))
+    codes = np.zeros(shape, dtype=np.int8)
+    correct = np.zeros(shape, dtype=bool)
+    times = np.full(shape, np.nan)
+    started = np.full(len(rows), np.nan)
+
+    for n, (_, _, question_ids, answers, answer_times, snapshot_id, started_at) in enumerate(rows):
+        question_ids = json.loads(question_ids)
+        paper = paper_questions(conn, snapshot_id, question_ids, live)
+        answers = json.loads(answers or "{}")
+        stamps = json.loads(answer_times or "{}")
+        if started_at is not None:
+            started[n] = started_at
+        for qid in question_ids:
+            chosen = answers.get(str(qid))
+            if not chosen:
+                continue
+            col = column[qid]
+            question = paper.get(qid)
+            if question is not None:
+                codes[n, col] = option_code(chosen)
+                correct[n, col] = chosen == question["correct_option"]
+            if str(qid) in stamps:
+                times[n, col] = stamps[str(qid)]
+
+    return Cohort([r[0] for r in rows], [r[1] for r in rows], np.array(item_ids, dtype=np.int64),
+                  codes, correct, times, started)
+
+
+def similar_pairs(cohort: Cohort, block: int = BLOCK) -> List[Tuple[int, int, int, float]]:
+    """Return (i, j, identical wrong answers, z) for suspicious pairs i < j."""
+    answered = (cohort.codes > 0).astype(np.float32)
+    wrong = (cohort.codes > 0) & ~cohort.correct
+    one_hot = np.concatenate(
+        [(wrong & (cohort.codes == o)).astype(np.float32) for o in range(1, len(OPTION_CODES) + 1)], axis=1
+    )
+
+    # Under independence, candidates a and b share a wrong option on item i
+    # with probability w_a * w_b * s_i: w is each candidate's wrong-answer
+    # rate (so weak candidates are not flagged just for being weak) and s_i
+    # the chance two wrong answers to item i pick the same option.
+    rate = wrong.sum(axis=1) / np.maximum(answered.sum(axis=1), 1)
+    counts = one_hot.reshape(len(cohort.session_ids), len(OPTION_CODES), -1).sum(axis=0)
+    s = ((counts / np.maximum(counts.sum(axis=0), 1)) ** 2).sum(axis=0)
+    left = (answered * rate[:, None] * s).astype(np.float32)
+    right = (answered * rate[:, None]).astype(np.float32)
+    left_sq = (answered * (rate[:, None] * s) ** 2).astype(np.float32)
+    right_sq = right ** 2
+
+    pairs = []
+    n = len(cohort.session_ids)
+    for lo in range(0, n, block):
+        hi = min(lo + block, n)
+        observed = one_hot[lo:hi] @ one_hot.T
+        expected = left[lo:hi] @ right.T
+        variance = expected - left_sq[lo:hi] @ right_sq.T
+        z = (observed - expected) / np.sqrt(variance + 1e-9)
+        # only count each pair once (j > i)
+        upper = np.arange(n)[None, :] > np.arange(lo, hi)[:, None]
+        hits = np.argwhere(upper & (observed >= MIN_IDENTICAL_WRONG) & (z >= PAIR_Z))
+        for bi, j in hits:
+            pairs.append((lo + int(bi), int(j), int(observed[bi, j]), float(z[bi, j])))
+    return pairs
+
+
+def timing_anomalies(cohort: Cohort) -> List[Tuple[int, float, float, float]]:
+    """Return (i, robust z, median latency, fast fraction) for flagged candidates."""
+    stamps = np.sort(cohort.times, axis=1)  # NaNs sort last
+    stamps = np.concatenate([cohort.started[:, None], stamps], axis=1)
+    latency = np.diff(stamps, axis=1)
+    timed = np.sum(~np.isnan(latency), axis=1)
+
+    with np.errstate(all="ignore"):
+        median = np.nanmedian(latency, axis=1)
+        fast = np.nansum(latency < FAST_SECONDS, axis=1) / np.maximum(timed, 1)
+        log_median = np.log(np.maximum(median, 0.1))
+        valid = timed >= MIN_TIMED
+        centre = np.nanmedian(log_median[valid]) if valid.any() else np.nan
+        deviation = np.abs(log_median[valid] - centre)
+        mad = np.nanmedian(deviation) if valid.any() else np.nan
+        if mad > 0:
+            z = 0.6745 * (log_median - centre) / mad
+        else:
+            # over half the cohort share one median (e.g. a uniform pace): scale
+            # by the mean absolute deviation instead, and flag nobody if that is 0 too
+            mean_ad = np.nanmean(deviation) if valid.any() else np.nan
+            z = (log_median - centre) / (1.2533 * mean_ad) if mean_ad > 0 else np.zeros_like(log_median)
+
+    flagged = valid & ((z <= -TIMING_Z) | (fast >= FAST_FRACTION))
+    return [(int(i), float(z[i]), float(median[i]), float(fast[i])) for i in np.flatnonzero(flagged)]
+
+
+def analyse(conn: sqlite3.Connection, label: str, start: str, end: str) -> Dict[str, int]:
+    """Analyse a cohort and replace its rows in `integrity_flags`."""
+    cohort = load_cohort(conn, start, end)
+    if cohort.session_ids:
+        pairs = similar_pairs(cohort)
+        timing = timing_anomalies(cohort)
+    else:
+        # nothing submitted in the range; still clear any earlier flags
+        pairs, timing = [], []
+
+    sid, uid = cohort.session_ids, cohort.user_ids
+    rows = [
+        (label, "pair", sid[i], uid[i], sid[j], uid[j], z, f"{shared} identical wrong answers")
+        for i, j, shared, z in pairs
+    ] + [
+        (label, "timing", sid[i], uid[i], None, None, z,
+         f"median {median:.1f}s per answer, {fast:.0%} under {FAST_SECONDS:.0f}s")
+        for i, z, median, fast in timing
+    ]
+    with conn:
+        conn.execute("DELETE FROM integrity_flags WHERE cohort=?", (label,))
+        conn.executemany(
+            """
+            INSERT INTO integrity_flags
+                (cohort, kind, session_id, user_id, other_session_id, other_user_id, statistic, detail, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+            """,
+            rows,
+        )
+    return {"attempts": len(sid), "pairs": len(pairs), "timing": len(timing)}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from init_db import ensure_runtime_schema
+
+    parser = argparse.ArgumentParser(description="Flag answer copying and implausible timing in a sitting")
+    parser.add_argument("command", choices=["analyse"])
+    parser.add_argument("label", help="cohort name shown in the admin report")
+    parser.add_argument("--start", required=True, help="first submission date (inclusive), YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="last submission date (exclusive), YYYY-MM-DD")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    with sqlite3.connect(args.db) as conn:
+        ensure_runtime_schema(conn)
+        started = time.perf_counter()
+        summary = analyse(conn, args.label, args.start, args.end)
+    print(f"✅ Analysed {summary['attempts']} attempts in {time.perf_counter() - started:.2f}s: "
+          f"{summary['pairs']} similar pairs, {summary['timing']} timing anomalies")
+
+
+if __name__ == "__main__":
+    main()
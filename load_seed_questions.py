@@ -11,6 +11,10 @@ import sqlite3
 import csv
 import sys
 
+from bank_snapshots import publish_snapshot
+from init_db import ensure_runtime_schema
+import similarity_index
+
 
 DB_FILE = Path("cbt.db")
 CSV_FILE = Path("seed_questions.csv")
@@ -77,7 +81,19 @@ def reset_questions(db_path: Path = DB_FILE, csv_path: Path = CSV_FILE) -> None:
 
         conn.commit()
 
+        # Ids were reassigned above; attempts in progress stay pinned to
+        # the previous snapshot, new logins get this one.
+        ensure_runtime_schema(conn)
+        # IRT parameters are keyed by question id; the old ones now describe
+        # different questions, so new snapshots start from the defaults
+        conn.execute("DELETE FROM item_params")
+        conn.commit()
+        pairs = similarity_index.rebuild(conn)
+        snapshot_id = publish_snapshot(conn)
+
     print(f"✅ Questions table refreshed: {inserted} rows inserted (skipped {skipped})")
+    print(f"ℹ Near-duplicate question pairs flagged: {pairs}")
+    print(f"✅ Published question-bank snapshot {snapshot_id}")
 
 
 def main() -> None:
@@ -0,0 +1,326 @@
+"""Data access for the app's routes, on the declared Flask-SQLAlchemy engine.
+
+Routes go through the functions here instead of hand-writing SQL. Each
+function takes the request's SQLAlchemy `Connection` (see `app.get_conn`),
+issues as few statements as the operation needs (updates use `RETURNING`
+rather than re-reading the row they changed) and returns typed row objects.
+Writes are left uncommitted; the caller commits, as with the other modules.
+
+The request's plain sqlite3 connection (`app.get_db`) is the DBAPI connection
+underneath the same pooled SQLAlchemy connection, so modules that still use
+sqlite3 directly share one connection and one transaction per request.
+
+Row classes use `__slots__` (no per-row `__dict__`) and support `row["col"]`
+so templates written against `sqlite3.Row` keep working.
+
+`assert_max_queries()` counts the SQL statements run on pooled connections
+inside a block and fails if an endpoint goes over its query budget.
+"""
+
+from contextlib import contextmanager
+import json
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import Pool
+
+from bank_snapshots import BankSnapshot
+
+
+sqla = SQLAlchemy()
+
+QUESTION_FIELDS = ("question", "option_a", "option_b", "option_c", "option_d", "correct_option")
+
+
+class Row:
+    """Base for typed result rows; subclasses list their columns in `__slots__`."""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    @classmethod
+    def columns(cls) -> str:
+        return ", ".join(cls.__slots__)
+
+
+class UserRow(Row):
+    __slots__ = ("id", "user_id", "pin", "active")
+    id: int
+    user_id: str
+    pin: str
+    active: int
+
+
+class QuestionRow(Row):
+    __slots__ = ("id",) + QUESTION_FIELDS
+    id: int
+    question: str
+    option_a: str
+    option_b: str
+    option_c: str
+    option_d: str
+    correct_option: str
+
+
+class AnswerRow(Row):
+    __slots__ = ("question_id", "selected_option", "answered_at")
+    question_id: int
+    selected_option: str
+    answered_at: Optional[float]
+
+
+class FlagRow(Row):
+    __slots__ = ("kind", "session_id", "user_id", "other_session_id", "other_user_id", "statistic", "detail")
+    kind: str
+    session_id: int
+    user_id: str
+    other_session_id: Optional[int]
+    other_user_id: Optional[str]
+    statistic: float
+    detail: str
+
+
+class NavState(Row):
+    __slots__ = ("index", "answered", "active")
+    index: int
+    answered: bool
+    active: bool
+
+
+class ExamPage(Row):
+    """Everything `exam.html` needs for one question."""
+
+    __slots__ = ("question", "saved_answer", "nav_states")
+    question: Optional[Dict]
+    saved_answer: Optional[Dict[str, str]]
+    nav_states: List[NavState]
+
+
+# --- Users and admins ---
+def find_active_user(conn: Connection, user_id: str, pin: str) -> Optional[UserRow]:
+    row = conn.execute(
+        text(f"SELECT {UserRow.columns()} FROM users WHERE user_id=:user_id AND pin=:pin AND active=1"),
+        {"user_id": user_id, "pin": pin},
+    ).first()
+    return UserRow(*row) if row else None
+
+
+def find_active_admin(conn: Connection, username: str, pin: str) -> Optional[int]:
+    return conn.execute(
+        text("SELECT id FROM admins WHERE username=:username AND pin=:pin AND active=1"),
+        {"username": username, "pin": pin},
+    ).scalar()
+
+
+def list_users(conn: Connection, active: bool = True) -> List[UserRow]:
+    rows = conn.execute(
+        text(f"SELECT {UserRow.columns()} FROM users WHERE active=:active ORDER BY id"), {"active": int(active)}
+    )
+    return [UserRow(*r) for r in rows]
+
+
+def add_user(conn: Connection, user_id: str, pin: str) -> bool:
+    """Insert an active user; False if the login id is already taken."""
+    try:
+        conn.execute(
+            text("INSERT INTO users (user_id, pin, active) VALUES (:user_id, :pin, 1)"),
+            {"user_id": user_id, "pin": pin},
+        )
+    except IntegrityError:
+        return False
+    return True
+
+
+def set_user_active(conn: Connection, user_pk: int, active: Optional[bool] = None) -> Optional[UserRow]:
+    """Set (or with `active=None`, toggle) a user's flag; returns the updated row."""
+    value = "CASE active WHEN 1 THEN 0 ELSE 1 END" if active is None else str(int(active))
+    row = conn.execute(
+        text(f"UPDATE users SET active={value} WHERE id=:id RETURNING {UserRow.columns()}"), {"id": user_pk}
+    ).first()
+    return UserRow(*row) if row else None
+
+
+def delete_user(conn: Connection, user_pk: int) -> Optional[str]:
+    """Delete a user with their answers, attempts and scorecards; returns their login id."""
+    user_id = conn.execute(text("DELETE FROM users WHERE id=:id RETURNING user_id"), {"id": user_pk}).scalar()
+    if user_id is not None:
+        conn.execute(text("DELETE FROM answers WHERE user_id=:user_id"), {"user_id": user_id})
+        conn.execute(
+            text("DELETE FROM scorecards WHERE session_id IN (SELECT id FROM sessions WHERE user_id=:user_id)"),
+            {"user_id": user_id},
+        )
+        conn.execute(text("DELETE FROM sessions WHERE user_id=:user_id"), {"user_id": user_id})
+    return user_id
+
+
+# --- Questions ---
+def list_questions(conn: Connection) -> List[QuestionRow]:
+    rows = conn.execute(text(f"SELECT {QuestionRow.columns()} FROM questions ORDER BY id DESC"))
+    return [QuestionRow(*r) for r in rows]
+
+
+def add_question(conn: Connection, fields: Mapping[str, str]) -> int:
+    return conn.execute(
+        text("""
+            INSERT INTO questions (question, option_a, option_b, option_c, option_d, correct_option)
+            VALUES (:question, :option_a, :option_b, :option_c, :option_d, :correct_option)
+            RETURNING id
+        """),
+        {k: fields[k] for k in QUESTION_FIELDS},
+    ).scalar_one()
+
+
+def update_question(conn: Connection, question_id: int, fields: Mapping[str, str]) -> bool:
+    """Overwrite a question's text and options; False if there is no such question."""
+    return conn.execute(
+        text("""
+            UPDATE questions
+            SET question=:question, option_a=:option_a, option_b=:option_b, option_c=:option_c,
+                option_d=:option_d, correct_option=:correct_option
+            WHERE id=:id
+        """),
+        {"id": question_id, **{k: fields[k] for k in QUESTION_FIELDS}},
+    ).rowcount > 0
+
+
+def delete_question(conn: Connection, question_id: int) -> bool:
+    """Delete a question; False if there is no such question."""
+    return conn.execute(text("DELETE FROM questions WHERE id=:id"), {"id": question_id}).rowcount > 0
+
+
+# --- Attempts ---
+def start_attempt(conn: Connection, user_id: str, question_ids: Sequence[int], snapshot_id: int) -> int:
+    """Clear the user's previous answers and record a new attempt; returns its id."""
+    conn.execute(text("DELETE FROM answers WHERE user_id=:user_id"), {"user_id": user_id})
+    return conn.execute(
+        text("""
+            INSERT INTO sessions (user_id, question_ids, started_at, snapshot_id)
+            VALUES (:user_id, :question_ids, datetime('now'), :snapshot_id)
+            RETURNING id
+        """),
+        {"user_id": user_id, "question_ids": json.dumps(list(question_ids)), "snapshot_id": snapshot_id},
+    ).scalar_one()
+
+
+def saved_answers(conn: Connection, user_id: str) -> List[AnswerRow]:
+    rows = conn.execute(
+        text(f"SELECT {AnswerRow.columns()} FROM answers WHERE user_id=:user_id"), {"user_id": user_id}
+    )
+    return [AnswerRow(*r) for r in rows]
+
+
+def finalise_attempt(conn: Connection, attempt_id: int, answers: Mapping[int, str],
+                     answer_times: Mapping[int, float], score: int) -> None:
+    """Record the final answers and score, unless the attempt is already submitted."""
+    conn.execute(
+        text("""
+            UPDATE sessions SET answers=:answers, answer_times=:answer_times, score=:score,
+                                submitted_at=datetime('now')
+            WHERE id=:id AND submitted_at IS NULL
+        """),
+        {
+            "id": attempt_id,
+            "answers": json.dumps({str(k): v for k, v in answers.items()}),
+            "answer_times": json.dumps({str(k): v for k, v in answer_times.items()}),
+            "score": score,
+        },
+    )
+
+
+# --- Integrity report ---
+def integrity_cohorts(conn: Connection) -> List[str]:
+    """Analysed cohorts, most recently analysed first."""
+    return list(conn.execute(text(
+        "SELECT cohort FROM integrity_flags GROUP BY cohort ORDER BY MAX(created_at) DESC"
+    )).scalars())
+
+
+def integrity_flags(conn: Connection, cohort: str) -> List[FlagRow]:
+    rows = conn.execute(
+        text(f"SELECT {FlagRow.columns()} FROM integrity_flags WHERE cohort=:cohort ORDER BY kind, statistic DESC"),
+        {"cohort": cohort},
+    )
+    return [FlagRow(*r) for r in rows]
+
+
+def exam_page(snapshot: BankSnapshot, paper: Sequence[int], index: int, answers: Mapping[str, str]) -> ExamPage:
+    """Build the question, saved answer and navigator state in one pass.
+
+    The question comes from the memory-mapped snapshot and the answers from
+    the attempt's session copy, so rendering a question runs no SQL.
+    """
+    question_id = paper[index]
+    saved = answers.get(str(question_id))
+    nav = [NavState(i, str(qid) in answers, i == index) for i, qid in enumerate(paper)]
+    return ExamPage(snapshot.get(question_id), {"selected_option": saved} if saved else None, nav)
+
+
+# --- Query budgets ---
+_SKIPPED = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+class QueryCounter:
+    """Statements traced on pooled connections while the counter is active."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def record(self, statement: str) -> None:
+        if not statement.lstrip().upper().startswith(_SKIPPED):
+            self.statements.append(statement)
+
+
+_counters: List[QueryCounter] = []
+
+
+def _trace(statement: str) -> None:
+    for counter in _counters:
+        counter.record(statement)
+
+
+@event.listens_for(Pool, "checkout")
+def _trace_on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    if _counters:
+        dbapi_connection.set_trace_callback(_trace)
+
+
+@event.listens_for(Pool, "checkin")
+def _untrace_on_checkin(dbapi_connection, connection_record) -> None:
+    if dbapi_connection is not None:
+        dbapi_connection.set_trace_callback(None)
+
+
+@contextmanager
+def assert_max_queries(budget: int) -> Iterator[QueryCounter]:
+    """Fail if more than `budget` SQL statements run inside the block.
+
+    Transaction control statements are not counted. Connections must be
+    checked out inside the block (as each request does), so warm the app up
+    with one request first: the first request in a process also creates the
+    runtime schema and fills caches.
+    """
+    counter = QueryCounter()
+    _counters.append(counter)
+    try:
+        yield counter
+    finally:
+        _counters.remove(counter)
+    if len(counter) > budget:
+        listing = "\n  ".join(" ".join(sql.split())[:200] for sql in counter.statements)
+        raise AssertionError(f"{len(counter)} queries, budget is {budget}:\n  {listing}")
@@ -31,7 +31,20 @@ CREATE TABLE IF NOT EXISTS sessions (
   score INTEGER,
   started_at TEXT,
   submitted_at TEXT,
-  FOREIGN KEY (user_id) REFERENCES users(user_id)
+  snapshot_id INTEGER,         -- question-bank snapshot the paper was drawn from
+  answer_times TEXT,           -- JSON object string {question_id: epoch seconds of the last change}
+  FOREIGN KEY (user_id) REFERENCES users(user_id),
+  FOREIGN KEY (snapshot_id) REFERENCES bank_snapshots(id)
+);
+
+-- BANK SNAPSHOTS TABLE
+-- Immutable, versioned question-bank files (see bank_snapshots.py)
+CREATE TABLE IF NOT EXISTS bank_snapshots (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  filename TEXT NOT NULL,
+  checksum TEXT NOT NULL,
+  question_count INTEGER NOT NULL,
+  created_at TEXT NOT NULL
 );
 
 DROP TABLE IF EXISTS users;
@@ -59,5 +72,115 @@ CREATE TABLE answers (
     user_id TEXT NOT NULL,
     question_id INTEGER NOT NULL,
     selected_option TEXT NOT NULL,
+    answered_at REAL,  -- epoch seconds, from the answer journal
     FOREIGN KEY (question_id) REFERENCES questions(id)
 );
+
+-- EDGE SYNC TABLES (see edge_sync.py)
+CREATE TABLE IF NOT EXISTS sync_batches (
+    batch_id TEXT PRIMARY KEY,
+    node_id TEXT NOT NULL,
+    received_at TEXT NOT NULL,
+    summary TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sync_sessions (
+    node_id TEXT NOT NULL,
+    remote_id INTEGER NOT NULL,
+    session_id INTEGER NOT NULL,
+    PRIMARY KEY (node_id, remote_id)
+);
+
+CREATE TABLE IF NOT EXISTS sync_conflicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    node_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    detected_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS synced_sessions (
+    session_id INTEGER PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+
+-- ANSWER JOURNAL CHECKPOINTS (see answer_journal.py)
+-- How far each journal segment has been folded into `answers`
+CREATE TABLE IF NOT EXISTS journal_checkpoints (
+    segment TEXT PRIMARY KEY,
+    position INTEGER NOT NULL  -- byte offset of the first record not yet compacted
+);
+
+-- ARCHIVE BOOKKEEPING (see archive.py)
+-- Exam cycles moved to their own database file, and the maintenance tasks' last runs
+CREATE TABLE IF NOT EXISTS archive_cycles (
+    label TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    session_count INTEGER NOT NULL,
+    archived_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS maintenance_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    ran_at TEXT NOT NULL
+);
+
+-- SCORECARDS (see scorecards.py)
+-- The finalised, compressed scorecard of each submitted attempt
+CREATE TABLE IF NOT EXISTS scorecards (
+    session_id INTEGER PRIMARY KEY,
+    snapshot_id INTEGER,
+    payload BLOB NOT NULL,  -- zlib-compressed JSON
+    created_at TEXT NOT NULL
+);
+
+-- NEAR-DUPLICATE INDEX (see similarity_index.py)
+-- MinHash signatures, their LSH buckets, and the question pairs kept off the same paper
+CREATE TABLE IF NOT EXISTS question_signatures (
+    question_id INTEGER PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS question_lsh (
+    band INTEGER NOT NULL,
+    bucket BLOB NOT NULL,
+    question_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_question_lsh_bucket ON question_lsh(band, bucket);
+CREATE INDEX IF NOT EXISTS idx_question_lsh_question ON question_lsh(question_id);
+
+CREATE TABLE IF NOT EXISTS question_siblings (
+    question_id INTEGER NOT NULL,
+    sibling_id INTEGER NOT NULL,  -- stored in both directions
+    PRIMARY KEY (question_id, sibling_id)
+);
+
+-- IRT ITEM PARAMETERS (see adaptive.py)
+-- Fitted by `python adaptive.py calibrate`; items without a row use a=1, b=0
+CREATE TABLE IF NOT EXISTS item_params (
+    question_id INTEGER PRIMARY KEY,
+    a REAL NOT NULL,  -- discrimination
+    b REAL NOT NULL,  -- difficulty
+    n_responses INTEGER NOT NULL,
+    calibrated_at TEXT NOT NULL
+);
+
+-- INTEGRITY FLAGS (see integrity.py)
+-- Suspicious pairs and timing outliers of a sitting, listed at /admin/integrity
+CREATE TABLE IF NOT EXISTS integrity_flags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cohort TEXT NOT NULL,
+    kind TEXT NOT NULL,           -- 'pair' or 'timing'
+    session_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    other_session_id INTEGER,     -- the other attempt of a 'pair'
+    other_user_id TEXT,
+    statistic REAL NOT NULL,      -- z-score
+    detail TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_integrity_flags_cohort ON integrity_flags(cohort);
@@ -0,0 +1,283 @@
+"""Render printable scorecards for every finished attempt in a sitting.
+
+Attempts submitted in a date range are streamed from `sessions` (joined to
+any stored `scorecards` payload) and rendered on a process pool. Each worker
+holds its own read-only database connection and Jinja environment; the
+parent only keeps a bounded window of tasks in flight, so memory does not
+grow with the size of the cohort.
+
+Finished files are written straight into zip parts under
+`<out>/<label>/`. A part is written as `part-NNNN.zip.partial` and renamed
+when it is closed, every `PART_SIZE` scorecards. Re-running the same command
+skips attempts already present in complete parts, so an interrupted run
+resumes where it stopped. Ctrl+C closes the open part cleanly; a killed
+process loses at most that one part. An attempt that fails to render is
+reported and counted, and the run carries on; re-running retries it.
+
+PDF output needs the optional `weasyprint` package; HTML needs nothing
+beyond Flask's own Jinja2.
+
+Usage:
+    python scorecard_batch.py 2026-H1 --start 2026-01-01 --end 2026-07-01 [--format html|pdf|both] [--workers 4]
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+import argparse
+import json
+import os
+import re
+import signal
+import sqlite3
+import sys
+import time
+import zipfile
+from typing import Dict, List, Optional, Set, Tuple
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from bank_snapshots import paper_questions
+import scorecards
+
+try:
+    from weasyprint import HTML
+except ImportError:  # optional: PDF output only
+    HTML = None
+
+
+DB_PATH = Path(os.environ.get("CBT_DATABASE", "cbt.db"))
+OUTPUT_DIR = Path(os.environ.get("CBT_SCORECARD_DIR", "scorecards"))
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+TEMPLATE = "scorecard_print.html"
+
+PART_SIZE = 500  # scorecards per zip part; an interruption loses at most one part
+IN_FLIGHT_PER_WORKER = 4  # queued tasks per worker; bounds parent memory
+PROGRESS_INTERVAL = 5.0  # seconds between throughput lines
+# Attempts per worker pool. The pool is drained and replaced after this many,
+# so a leak in the PDF renderer cannot grow unbounded. (Not `max_tasks_per_child`:
+# on Python 3.11 the executor can hang once it replaces a worker.)
+POOL_RECYCLE = 2000
+
+ATTEMPTS_SQL = """
+    SELECT s.id, s.user_id, s.submitted_at, s.snapshot_id, s.question_ids, s.answers, c.payload
+    FROM sessions s
+    LEFT JOIN scorecards c ON c.session_id = s.id
+    WHERE s.submitted_at IS NOT NULL AND s.submitted_at >= ? AND s.submitted_at < ?
+    ORDER BY s.id
+"""
+
+Attempt = Tuple[int, str, str, Optional[int], str, Optional[str], Optional[bytes]]
+
+
+def entry_stem(attempt_id: int, user_id: str) -> str:
+    """Archive file name (without extension) for an attempt; safe on any filesystem."""
+    return f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', user_id)}-{attempt_id}"
+
+
+# --- Worker side ---
+_worker: Dict = {}
+
+
+def _init_worker(db_path: str) -> None:
+    # Ctrl+C is handled by the parent, which stops submitting and lets the
+    # running tasks finish so the open part can be closed cleanly.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker["conn"] = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    _worker["template"] = Environment(
+        loader=FileSystemLoader(str(TEMPLATE_DIR)), autoescape=select_autoescape(["html"])
+    ).get_template(TEMPLATE)
+
+
+def _scorecard(attempt: Attempt) -> Dict:
+    """The stored scorecard, or one scored from the attempt's snapshot.
+
+    Attempts synced from edge nodes, or finalised before scorecards were
+    stored, have no payload yet.
+    """
+    attempt_id, _, _, snapshot_id, question_ids, answers, payload = attempt
+    if payload is not None:
+        return scorecards.decode(payload)
+    questions = paper_questions(_worker["conn"], snapshot_id, json.loads(question_ids)).values()
+    return scorecards.build_scorecard(questions, {int(k): v for k, v in json.loads(answers or "{}").items()})
+
+
+def render_attempt(attempt: Attempt, formats: Tuple[str, ...]) -> Tuple[str, List[Tuple[str, bytes]]]:
+    """Render one attempt; returns its entry stem and (file name, content) pairs."""
+    attempt_id, user_id, submitted_at = attempt[0], attempt[1], attempt[2]
+    card = _scorecard(attempt)
+    html = _worker["template"].render(user_id=user_id, attempt_id=attempt_id, submitted_at=submitted_at, **card)
+    stem = entry_stem(attempt_id, user_id)
+    files = []
+    if "html" in formats:
+        files.append((f"{stem}.html", html.encode("utf-8")))
+    if "pdf" in formats:
+        files.append((f"{stem}.pdf", HTML(string=html).write_pdf()))
+    return stem, files
+
+
+# --- Parent side ---
+class PartWriter:
+    """Writes scorecards into numbered zip parts, closing one every PART_SIZE entries."""
+
+    def __init__(self, directory: Path, first_part: int, part_size: int = PART_SIZE):
+        self.directory = directory
+        self.part = first_part
+        self.part_size = part_size
+        self.count = 0
+        self.bytes_written = 0
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._path: Optional[Path] = None
+
+    def write(self, files: List[Tuple[str, bytes]]) -> None:
+        if self._zip is None:
+            self._path = self.directory / f"part-{self.part:04d}.zip.partial"
+            self._zip = zipfile.ZipFile(self._path, "w")
+        for name, data in files:
+            # PDFs are already compressed; deflating them again only costs time
+            method = zipfile.ZIP_STORED if name.endswith(".pdf") else zipfile.ZIP_DEFLATED
+            self._zip.writestr(name, data, compress_type=method)
+            self.bytes_written += len(data)
+        self.count += 1
+        if self.count % self.part_size == 0:
+            self.close()
+
+    def close(self) -> None:
+        if self._zip is None:
+            return
+        self._zip.close()
+        os.replace(self._path, self._path.with_suffix(""))  # drop ".partial"
+        self._zip = None
+        self.part += 1
+
+
+def completed(directory: Path) -> Tuple[Set[str], int]:
+    """Entry stems already in complete parts, and the next part number.
+
+    Parts left `.partial` by an interrupted run are discarded.
+    """
+    for leftover in directory.glob("part-*.zip.partial"):
+        leftover.unlink()
+    done: Set[str] = set()
+    last = 0
+    for path in sorted(directory.glob("part-*.zip")):
+        try:
+            with zipfile.ZipFile(path) as zf:
+                done.update(name.rsplit(".", 1)[0] for name in zf.namelist())
+        except zipfile.BadZipFile:
+            path.unlink()
+            continue
+        last = max(last, int(path.stem.split("-")[1]))
+    return done, last + 1
+
+
+def _report(processed: int, total: int, rendered: int, errors: int, started: float, bytes_written: int,
+            final: bool = False) -> None:
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    line = (f"{processed}/{total} scorecards, {rendered / elapsed:.1f} rendered/s, "
+            f"{errors} failed, {bytes_written / 1e6:.1f} MB in {elapsed:.1f}s")
+    print(("✅ Done: " if final else "   ") + line, flush=True)
+
+
+def generate(db_path: Path, label: str, start: str, end: str, out_dir: Path = OUTPUT_DIR,
+             formats: Tuple[str, ...] = ("html",), workers: Optional[int] = None,
+             part_size: int = PART_SIZE, recycle: int = POOL_RECYCLE) -> Dict[str, int]:
+    """Render every attempt submitted in [start, end) into `<out_dir>/<label>/`."""
+    if "pdf" in formats and HTML is None:
+        raise RuntimeError("PDF output needs the optional 'weasyprint' package (pip install weasyprint)")
+    directory = out_dir / re.sub(r"[^A-Za-z0-9_.-]+", "_", label)
+    directory.mkdir(parents=True, exist_ok=True)
+    done, next_part = completed(directory)
+    workers = workers or os.cpu_count() or 1
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    total = conn.execute(
+        "SELECT COUNT(*) FROM sessions WHERE submitted_at IS NOT NULL AND submitted_at >= ? AND submitted_at < ?",
+        (start, end),
+    ).fetchone()[0]
+    writer = PartWriter(directory, next_part, part_size)
+    skipped = rendered = errors = submitted = 0
+    started = last_report = time.perf_counter()
+
+    def new_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(str(db_path),))
+
+    pool = new_pool()
+    pending: Dict[Future, int] = {}  # future -> attempt id
+
+    def collect(future: Future) -> None:
+        nonlocal rendered, errors
+        attempt_id = pending.pop(future)
+        try:
+            _, files = future.result()
+        except BrokenProcessPool:
+            raise  # the pool itself is gone, not just this attempt
+        except Exception as exc:
+            # one bad attempt must not stop the sitting; it stays out of the
+            # parts, so the next run tries it again
+            errors += 1
+            print(f"⚠ Attempt {attempt_id} failed to render: {exc!r}", file=sys.stderr, flush=True)
+            return
+        writer.write(files)
+        rendered += 1
+
+    try:
+        for attempt in conn.execute(ATTEMPTS_SQL, (start, end)):
+            if entry_stem(attempt[0], attempt[1]) in done:
+                skipped += 1
+                continue
+            if submitted and submitted % recycle == 0:
+                for future in list(pending):
+                    collect(future)
+                pool.shutdown(wait=True)
+                pool = new_pool()
+            elif len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(future)
+            pending[pool.submit(render_attempt, attempt, formats)] = attempt[0]
+            submitted += 1
+            if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+                _report(skipped + rendered + errors, total, rendered, errors, started, writer.bytes_written)
+                last_report = time.perf_counter()
+        for future in list(pending):
+            collect(future)
+    finally:
+        # keep what has been written so far; the next run resumes after it
+        pool.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+        conn.close()
+    _report(skipped + rendered + errors, total, rendered, errors, started, writer.bytes_written, final=True)
+    return {"total": total, "rendered": rendered, "skipped": skipped, "errors": errors,
+            "parts": writer.part - next_part}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Render printable scorecards for a sitting into zip archives")
+    parser.add_argument("label", help="cohort name, used for the output folder")
+    parser.add_argument("--start", required=True, help="first submission date (inclusive), YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="last submission date (exclusive), YYYY-MM-DD")
+    parser.add_argument("--format", choices=["html", "pdf", "both"], default="html")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--out", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    formats = ("html", "pdf") if args.format == "both" else (args.format,)
+    try:
+        summary = generate(args.db, args.label, args.start, args.end, args.out, formats, args.workers)
+    except RuntimeError as exc:
+        print(f"❌ {exc}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("⏸ Interrupted. Finished scorecards were kept; run the same command again to resume.")
+        sys.exit(130)
+    print(f"   {summary['rendered']} rendered, {summary['skipped']} already done, "
+          f"{summary['parts']} new part(s) in {args.out}")
+    if summary["errors"]:
+        print(f"⚠ {summary['errors']} scorecard(s) failed to render; run the same command again to retry them.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
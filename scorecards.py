@@ -0,0 +1,134 @@
+"""Immutable scorecards for submitted exam attempts.
+
+When an attempt is finalised its score, counts and per-question review are
+computed once and stored zlib-compressed in the `scorecards` table. Later
+views of the result go through a bounded in-process LRU cache keyed by
+(attempt id, question-bank snapshot id), so refreshing `/results` is a
+dictionary lookup and at most one primary-key read on a cache miss.
+"""
+
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Hashable, Iterable, Mapping, Optional
+
+from bank_snapshots import OPTION_CODES
+
+
+CACHE_SIZE = 512
+OPTION_LABELS = dict(zip(OPTION_CODES, "ABCD"))
+
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Dict) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+_cache = LRUCache()
+
+
+def build_scorecard(questions: Iterable[Mapping], answers: Mapping[int, str]) -> Dict:
+    """Score a paper and build the per-question review shown by `results.html`."""
+    score = 0
+    answered_count = 0
+    skipped_count = 0
+    detailed_results = []
+
+    for q in questions:
+        user_answer = answers.get(q["id"])
+        correct_option = q["correct_option"]
+
+        if user_answer:
+            answered_count += 1
+        else:
+            skipped_count += 1
+
+        is_correct = (user_answer == correct_option) if user_answer else False
+        if is_correct:
+            score += 1
+
+        detailed_results.append({
+            "question_id": q["id"],
+            "question": q["question"],
+            "options": {
+                "option_a": q["option_a"],
+                "option_b": q["option_b"],
+                "option_c": q["option_c"],
+                "option_d": q["option_d"],
+            },
+            "user_answer": OPTION_LABELS.get(user_answer, "Unanswered"),
+            "correct_answer": OPTION_LABELS.get(correct_option, correct_option),
+            "is_correct": is_correct,
+        })
+
+    return {
+        "score": score,
+        "total": len(detailed_results),
+        "answered": answered_count,
+        "skipped": skipped_count,
+        "results": detailed_results,
+    }
+
+
+def encode(card: Dict) -> bytes:
+    return zlib.compress(json.dumps(card, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def decode(blob: bytes) -> Dict:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def store_scorecard(conn: sqlite3.Connection, attempt_id: int, snapshot_id: int, card: Dict) -> None:
+    """Persist the scorecard unless one exists.
+
+    The first scorecard written for an attempt wins: the caller commits and
+    then reads back the stored version with `get_scorecard`, so two
+    concurrent requests finalising the same attempt show the same one.
+    Nothing is stored for an attempt that is not in the hot `sessions` table
+    (archived or deleted while its browser session lived on).
+    """
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO scorecards (session_id, snapshot_id, payload, created_at)
+        SELECT ?, ?, ?, datetime('now')
+        WHERE EXISTS (SELECT 1 FROM sessions WHERE id=?)
+        """,
+        (attempt_id, snapshot_id, encode(card), attempt_id),
+    )
+
+
+def get_scorecard(conn: sqlite3.Connection, attempt_id: int, snapshot_id: int) -> Optional[Dict]:
+    """Return the finalised scorecard for an attempt, or None if not finalised."""
+    key = (attempt_id, snapshot_id)
+    card = _cache.get(key)
+    if card is not None:
+        return card
+    row = conn.execute(
+        "SELECT payload FROM scorecards WHERE session_id=? AND snapshot_id=?",
+        (attempt_id, snapshot_id),
+    ).fetchone()
+    if row is None:
+        return None
+    card = decode(row[0])
+    _cache.put(key, card)
+    return card
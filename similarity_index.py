@@ -0,0 +1,187 @@
+"""Near-duplicate detection for the question bank (shingling + MinHash/LSH).
+
+Each question is reduced to character shingles of its normalised stem and
+options, summarised as a MinHash signature and stored in `question_signatures`.
+The signature is split into LSH bands stored in `question_lsh`, so looking up
+the likely near-duplicates of one question is a handful of indexed bucket
+lookups rather than a comparison against every other question.
+
+Candidates from the buckets are confirmed by their estimated Jaccard
+similarity; confirmed pairs are kept in `question_siblings` and the paper
+generator uses them to avoid putting two siblings on the same paper.
+"""
+
+from pathlib import Path
+import argparse
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import struct
+from typing import Dict, Iterable, List, Mapping, Sequence, Set
+
+
+DB_PATH = Path(os.environ.get("CBT_DATABASE", "cbt.db"))
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 similarity usually collide
+ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.6  # estimated Jaccard similarity that counts as a near-duplicate
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)  # fixed seed: signatures must be stable across runs
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_SIGNATURE = struct.Struct(f"<{NUM_PERM}Q")
+
+
+def question_text(row: Mapping) -> str:
+    """Combine stem and options; options are sorted so their order does not matter."""
+    options = sorted(filter(None, (row["option_a"], row["option_b"], row["option_c"], row["option_d"])))
+    return " | ".join([row["question"], *options])
+
+
+def shingles(text: str) -> Set[bytes]:
+    normalised = " ".join(re.sub(r"[^\w|]+", " ", text.lower()).split())
+    if len(normalised) <= SHINGLE_SIZE:
+        return {normalised.encode("utf-8")}
+    return {normalised[i:i + SHINGLE_SIZE].encode("utf-8")
+            for i in range(len(normalised) - SHINGLE_SIZE + 1)}
+
+
+def signature(text: str) -> List[int]:
+    hashes = [int.from_bytes(hashlib.blake2b(s, digest_size=8).digest(), "little") for s in shingles(text)]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def similarity(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def _bands(sig: Sequence[int]) -> List[bytes]:
+    return [hashlib.blake2b(struct.pack(f"<{ROWS}Q", *sig[i * ROWS:(i + 1) * ROWS]), digest_size=8).digest()
+            for i in range(BANDS)]
+
+
+def remove_question(conn: sqlite3.Connection, question_id: int) -> None:
+    conn.execute("DELETE FROM question_signatures WHERE question_id=?", (question_id,))
+    conn.execute("DELETE FROM question_lsh WHERE question_id=?", (question_id,))
+    conn.execute("DELETE FROM question_siblings WHERE question_id=? OR sibling_id=?", (question_id, question_id))
+
+
+def index_question(conn: sqlite3.Connection, question_id: int, text: str) -> List[int]:
+    """(Re)index one question and return the ids of its near-duplicates.
+
+    The caller commits, as with the other writes made in the same request.
+    """
+    remove_question(conn, question_id)
+    sig = signature(text)
+    bands = _bands(sig)
+
+    candidates: Set[int] = set()
+    for band, bucket in enumerate(bands):
+        candidates.update(r[0] for r in conn.execute(
+            "SELECT question_id FROM question_lsh WHERE band=? AND bucket=?", (band, bucket)
+        ))
+
+    siblings = []
+    for other in sorted(candidates):
+        row = conn.execute("SELECT signature FROM question_signatures WHERE question_id=?", (other,)).fetchone()
+        if row and similarity(sig, _SIGNATURE.unpack(row[0])) >= THRESHOLD:
+            siblings.append(other)
+
+    conn.execute(
+        "INSERT INTO question_signatures (question_id, signature) VALUES (?, ?)",
+        (question_id, _SIGNATURE.pack(*sig)),
+    )
+    conn.executemany(
+        "INSERT INTO question_lsh (band, bucket, question_id) VALUES (?, ?, ?)",
+        [(band, bucket, question_id) for band, bucket in enumerate(bands)],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO question_siblings (question_id, sibling_id) VALUES (?, ?)",
+        [pair for other in siblings for pair in ((question_id, other), (other, question_id))],
+    )
+    return siblings
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Index the whole live `questions` table; returns the number of sibling pairs.
+
+    The caller commits.
+    """
+    conn.execute("DELETE FROM question_signatures")
+    conn.execute("DELETE FROM question_lsh")
+    conn.execute("DELETE FROM question_siblings")
+    rows = conn.execute(
+        "SELECT id, question, option_a, option_b, option_c, option_d FROM questions ORDER BY id"
+    ).fetchall()
+    pairs = 0
+    for row in rows:
+        row = dict(zip(("id", "question", "option_a", "option_b", "option_c", "option_d"), row))
+        pairs += len(index_question(conn, row["id"], question_text(row)))
+    return pairs
+
+
+def ensure_index(conn: sqlite3.Connection) -> None:
+    """Build the index for a database that predates it."""
+    if conn.execute("SELECT 1 FROM question_signatures LIMIT 1").fetchone() is None:
+        rebuild(conn)
+
+
+def sibling_map(conn: sqlite3.Connection) -> Dict[int, Set[int]]:
+    siblings: Dict[int, Set[int]] = {}
+    for question_id, sibling_id in conn.execute("SELECT question_id, sibling_id FROM question_siblings"):
+        siblings.setdefault(question_id, set()).add(sibling_id)
+    return siblings
+
+
+def siblings_of(conn: sqlite3.Connection, question_ids: Sequence[int]) -> Set[int]:
+    placeholders = ", ".join("?" for _ in question_ids)
+    return {r[0] for r in conn.execute(
+        f"SELECT sibling_id FROM question_siblings WHERE question_id IN ({placeholders})", list(question_ids)
+    )}
+
+
+def draw_paper(question_ids: Iterable[int], size: int, siblings: Mapping[int, Set[int]]) -> List[int]:
+    """Randomly pick up to `size` questions, never two near-duplicates together.
+
+    If excluding siblings leaves too few questions, the paper is topped up
+    from the excluded ones rather than coming out short.
+    """
+    pool = list(question_ids)
+    random.shuffle(pool)
+    paper: List[int] = []
+    blocked: Set[int] = set()
+    skipped: List[int] = []
+    for qid in pool:
+        if len(paper) == size:
+            break
+        if qid in blocked:
+            skipped.append(qid)
+            continue
+        paper.append(qid)
+        blocked.update(siblings.get(qid, ()))
+    paper.extend(skipped[:size - len(paper)])
+    return paper
+
+
+def main() -> None:
+    from init_db import ensure_runtime_schema
+
+    parser = argparse.ArgumentParser(description="Rebuild the near-duplicate index and list sibling pairs")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args()
+    with sqlite3.connect(args.db) as conn:
+        ensure_runtime_schema(conn)
+        rebuild(conn)
+        for a, b in conn.execute(
+            "SELECT question_id, sibling_id FROM question_siblings WHERE question_id < sibling_id ORDER BY 1, 2"
+        ):
+            print(f"{a} ~ {b}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""IRT calibration and adaptive item selection.
+
+Calibration runs on simulated attempts written into a throwaway copy of
+cbt.db (see `conftest.py`), so `response_matrix` scores them the same way it
+scores real ones.
+"""
+import json
+
+import numpy as np
+
+OPTIONS = ('option_a', 'option_b', 'option_c', 'option_d')
+
+
+def test_calibrate_recovers_known_parameters(cbt_env):
+    adaptive = cbt_env.module('adaptive')
+    conn = cbt_env.connect()
+    questions = [dict(zip(('id',) + OPTIONS + ('correct_option',), r)) for r in conn.execute(
+        "SELECT id, option_a, option_b, option_c, option_d, correct_option FROM questions ORDER BY id")]
+    rng = np.random.default_rng(7)
+    a = rng.uniform(0.7, 2.0, len(questions))
+    b = rng.uniform(-1.5, 1.5, len(questions))
+    c = np.array([adaptive._guessing(q) for q in questions])
+    theta = rng.standard_normal(3000)
+    correct = rng.random((len(theta), len(questions))) < adaptive._probability(a, b, c, theta)
+
+    ids = [q['id'] for q in questions]
+    attempts = []
+    for row in correct:
+        answers = {}
+        for q, right in zip(questions, row):
+            wrong = [o for o in OPTIONS if q[o] and o != q['correct_option']]
+            answers[str(q['id'])] = q['correct_option'] if right else wrong[0]
+        attempts.append(('sim', json.dumps(ids), json.dumps(answers)))
+    conn.executemany(
+        "INSERT INTO sessions (user_id, question_ids, answers, started_at, submitted_at) "
+        "VALUES (?, ?, ?, datetime('now'), datetime('now'))", attempts)
+
+    assert adaptive.calibrate(conn) == len(questions)
+    fitted = dict(((r[0]), r[1:]) for r in conn.execute("SELECT question_id, a, b, n_responses FROM item_params"))
+    fit_a = np.array([fitted[q][0] for q in ids])
+    fit_b = np.array([fitted[q][1] for q in ids])
+    assert {fitted[q][2] for q in ids} == {len(theta)}
+    assert np.corrcoef(fit_b, b)[0, 1] > 0.95
+    assert np.abs(fit_b - b).mean() < 0.25
+    assert np.corrcoef(fit_a, a)[0, 1] > 0.7
+    conn.close()
+
+
+def _bank(adaptive, n_items=60):
+    rng = np.random.default_rng(3)
+    a = rng.uniform(0.7, 2.0, n_items)
+    b = rng.uniform(-2.0, 2.0, n_items)
+    return adaptive.ItemBank(list(range(1, n_items + 1)), a, b, np.full(n_items, 0.25)), a, b
+
+
+def _exposure(adaptive, bank, a, b, top_k, start_top_k, candidates=300, paper_size=10):
+    """Simulate `candidates` exams; returns (times each item was shown, first items)."""
+    rng = np.random.default_rng(11)
+    seen = np.zeros(len(a))
+    firsts = set()
+    for _ in range(candidates):
+        ability = rng.standard_normal()
+        responses = []
+        item = bank.next_item(0.0, (), start_top_k, rng=rng)
+        firsts.add(item)
+        while item is not None and len(responses) < paper_size:
+            seen[item - 1] += 1
+            p = adaptive._probability(a[[item - 1]], b[[item - 1]], np.array([0.25]), np.array([ability]))[0, 0]
+            responses.append((item, rng.random() < p))
+            theta, _ = bank.estimate(responses)
+            item = bank.next_item(theta, [q for q, _ in responses], top_k, rng=rng)
+        assert len({q for q, _ in responses}) == paper_size
+    return seen, firsts
+
+
+def test_exposure_is_spread(cbt_env):
+    adaptive = cbt_env.module('adaptive')
+    bank, a, b = _bank(adaptive)
+    argmax_seen, argmax_firsts = _exposure(adaptive, bank, a, b, top_k=1, start_top_k=1)
+    seen, firsts = _exposure(adaptive, bank, a, b, adaptive.TOP_K, adaptive.START_TOP_K)
+
+    # plain argmax gives everyone the same first item and leaves much of the bank unused
+    assert len(argmax_firsts) == 1 and argmax_seen.max() == 300
+    assert len(firsts) == adaptive.START_TOP_K
+    assert seen.max() < 0.6 * argmax_seen.max()
+    assert (seen > 0).sum() > (argmax_seen > 0).sum()
+
+
+def test_next_item_runs_out(cbt_env):
+    adaptive = cbt_env.module('adaptive')
+    bank, _, _ = _bank(adaptive, n_items=8)
+    assert bank.next_item(0.0, [1, 2, 3, 4, 5, 6]) in (7, 8)
+    assert bank.next_item(0.0, range(1, 9)) is None
+
+
+def test_adaptive_logins_start_on_different_items(cbt_env):
+    cbt_env.setenv(CBT_EXAM_MODE='adaptive')
+    app = cbt_env.app()
+    firsts = set()
+    for _ in range(40):
+        client = app.test_client()
+        client.post('/login', data={'user_id': 'testuser', 'pin': '1234'})
+        with client.session_transaction() as session:
+            assert session['adaptive'] and len(session['questions']) == 1
+            firsts.add(session['questions'][0])
+    assert len(firsts) > 1
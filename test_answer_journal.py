@@ -0,0 +1,118 @@
+"""Crash recovery, checkpointing and group commit of the answer journal.
+
+Each test gets its own database copy and journal folder (see `conftest.py`).
+"""
+import os
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def journal_env(cbt_env):
+    """(answer_journal module, journal folder, connection, attempt id of candidate 'u1')."""
+    conn = cbt_env.connect()
+    attempt_id = conn.execute(
+        "INSERT INTO sessions (user_id, question_ids, started_at) VALUES ('u1', '[1, 2, 3]', datetime('now'))"
+    ).lastrowid
+    yield cbt_env.module('answer_journal'), cbt_env.dir / 'journal', conn, attempt_id
+    conn.close()
+
+
+def _answers(conn):
+    return dict(conn.execute("SELECT question_id, selected_option FROM answers WHERE user_id='u1'"))
+
+
+def test_torn_tail_recovery(journal_env):
+    aj, journal_dir, conn, attempt_id = journal_env
+    journal = aj.AnswerJournal(journal_dir)
+    journal.append('u1', attempt_id, 1, 'option_a')
+    journal.append('u1', attempt_id, 2, 'option_b')
+    # simulate a crash half-way through writing the next record
+    segment = aj.segments(journal_dir)[0]
+    with open(segment, 'ab') as fh:
+        fh.write(aj.encode({'ts': time.time(), 'user_id': 'u1', 'attempt_id': attempt_id,
+                            'question_id': 3, 'option': 'option_c'})[:20])
+
+    assert aj.compact(conn, journal_dir) == 2
+    assert _answers(conn) == {1: 'option_a', 2: 'option_b'}
+
+    # the restarted worker's first record must not be lost to the torn line
+    aj.AnswerJournal(journal_dir).append('u1', attempt_id, 3, 'option_d')
+    assert aj.compact(conn, journal_dir) == 1
+    assert _answers(conn) == {1: 'option_a', 2: 'option_b', 3: 'option_d'}
+
+
+def test_checkpoint_and_replay(journal_env):
+    aj, journal_dir, conn, attempt_id = journal_env
+    journal = aj.AnswerJournal(journal_dir)
+    journal.append('u1', attempt_id, 1, 'option_a')
+    journal.append('u1', attempt_id, 1, 'option_b')
+    assert aj.compact(conn, journal_dir) == 2
+    assert aj.compact(conn, journal_dir) == 0  # nothing past the checkpoint
+    assert _answers(conn) == {1: 'option_b'}  # last write wins
+
+    journal.append('u1', attempt_id, 2, 'option_c')
+    assert aj.compact(conn, journal_dir) == 1
+
+    conn.execute("DELETE FROM answers WHERE user_id='u1'")
+    assert aj.replay(conn, journal_dir) == 3
+    assert _answers(conn) == {1: 'option_b', 2: 'option_c'}
+
+
+def test_old_segments_retire(journal_env):
+    aj, journal_dir, conn, attempt_id = journal_env
+    journal_dir.mkdir()
+    two_days_ago = time.time() - 2 * 86400
+    old = journal_dir / aj.segment_name(two_days_ago)
+    old.write_bytes(aj.encode({'ts': two_days_ago, 'user_id': 'u1', 'attempt_id': attempt_id,
+                               'question_id': 1, 'option': 'option_a'}))
+    aj.AnswerJournal(journal_dir).append('u1', attempt_id, 2, 'option_b')
+
+    assert aj.compact(conn, journal_dir) == 2
+    assert aj.compact(conn, journal_dir) == 0
+    # the finished day moved out of the compactor's way; today's stays
+    today = aj.segment_name(time.time())
+    assert [p.name for p in aj.segments(journal_dir)] == [today]
+    assert (journal_dir / aj.RETIRED / old.name).exists()
+    assert conn.execute("SELECT segment FROM journal_checkpoints").fetchall() == [(today,)]
+
+    # retired segments are still part of the history and of a replay
+    assert [e['question_id'] for e in aj.history('u1', journal_dir)] == [1, 2]
+    conn.execute("DELETE FROM answers WHERE user_id='u1'")
+    assert aj.replay(conn, journal_dir) == 2
+    assert _answers(conn) == {1: 'option_a', 2: 'option_b'}
+
+
+def test_group_commit(journal_env, monkeypatch):
+    aj, journal_dir, _, _ = journal_env
+    real_fsync = os.fsync
+    fsyncs = []
+
+    def slow_fsync(fd):
+        fsyncs.append(fd)
+        time.sleep(0.01)
+        real_fsync(fd)
+
+    journal = aj.AnswerJournal(journal_dir)
+    writers, per_writer = 16, 10
+    start = threading.Barrier(writers)
+
+    def write(n):
+        start.wait()
+        for i in range(per_writer):
+            journal.append(f'user{n}', None, i, 'option_a')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(aj.os, 'fsync', slow_fsync)
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    events = [e for path in aj.segments(journal_dir) for _, e in aj.read_segment(path)]
+    assert len(events) == writers * per_writer
+    # concurrent appends share fsyncs instead of paying one each
+    assert len(fsyncs) < writers * per_writer / 2
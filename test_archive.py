@@ -0,0 +1,98 @@
+"""Archiving an exam cycle, maintenance and read-only audits, end to end.
+
+Uses a throwaway copy of cbt.db and an archive folder beside it (see
+`conftest.py`).
+"""
+import sqlite3
+
+import pytest
+
+
+def _attempt(conn, user_id, submitted_at, answers=()):
+    """Record an attempt (and its working answers, as `exam()` leaves them)."""
+    session_id = conn.execute(
+        "INSERT INTO sessions (user_id, question_ids, started_at, submitted_at, answer_times) "
+        "VALUES (?, '[1, 2]', ?, ?, '{}')",
+        (user_id, submitted_at or '2026-01-20 09:00:00', submitted_at),
+    ).lastrowid
+    if submitted_at:
+        conn.execute("INSERT INTO scorecards VALUES (?, NULL, x'00', ?)", (session_id, submitted_at))
+    conn.execute("DELETE FROM answers WHERE user_id=?", (user_id,))
+    conn.executemany(
+        "INSERT INTO answers (user_id, question_id, selected_option, answered_at) VALUES (?, ?, ?, 1.5)",
+        [(user_id, qid, option) for qid, option in answers],
+    )
+    return session_id
+
+
+def test_archive_cycle_maintenance_and_audit(cbt_env):
+    archive = cbt_env.module('archive')
+    conn = cbt_env.connect()
+    jan = [
+        _attempt(conn, 'early', '2026-01-10 10:00:00'),
+        _attempt(conn, 'early', '2026-01-11 10:00:00', [(1, 'option_a'), (2, 'option_b')]),
+        _attempt(conn, 'resat', '2026-01-12 10:00:00', [(1, 'option_c')]),
+    ]
+    # a later attempt owns the working answers; an unsubmitted one never moves
+    march = _attempt(conn, 'resat', '2026-03-02 10:00:00', [(2, 'option_d')])
+    in_progress = _attempt(conn, 'sitting', None, [(1, 'option_a')])
+
+    assert archive.archive_cycle(conn, '2026-jan', '2026-01-01', '2026-02-01') == 3
+    hot_sessions = [r[0] for r in conn.execute("SELECT id FROM sessions WHERE user_id IN ('early', 'resat', 'sitting')")]
+    assert sorted(hot_sessions) == [march, in_progress]
+    assert conn.execute("SELECT COUNT(*) FROM scorecards WHERE session_id IN (?, ?, ?)", jan).fetchone() == (0,)
+    assert sorted(conn.execute("SELECT user_id, question_id FROM answers WHERE user_id IN ('early', 'resat', 'sitting')")) \
+        == [('resat', 2), ('sitting', 1)]
+
+    path = cbt_env.dir / 'archive' / 'cbt-2026-jan.db'
+    arc = sqlite3.connect(path)
+    assert sorted(r[0] for r in arc.execute("SELECT id FROM sessions")) == jan
+    assert sorted(r[0] for r in arc.execute("SELECT session_id FROM scorecards")) == jan
+    # the working answers went with the candidate's latest attempt in the cycle
+    assert sorted(arc.execute("SELECT user_id, question_id, session_id, answered_at FROM answers")) \
+        == [('early', 1, jan[1], 1.5), ('early', 2, jan[1], 1.5)]
+    arc.close()
+
+    # re-running the same cycle moves nothing and counts nothing twice
+    assert archive.archive_cycle(conn, '2026-jan', '2026-01-01', '2026-02-01') == 0
+    assert conn.execute("SELECT filename, session_count FROM archive_cycles").fetchall() == [(path.name, 3)]
+    arc = sqlite3.connect(path)
+    assert arc.execute("SELECT COUNT(*) FROM sessions").fetchone() == (3,)
+    assert arc.execute("SELECT COUNT(*) FROM answers").fetchone() == (2,)
+    arc.close()
+    with pytest.raises(ValueError):
+        archive.archive_cycle(conn, '../escape', '2026-01-01', '2026-02-01')
+
+    # maintenance: convert once, then incremental vacuum gives free pages back
+    archive.run_maintenance(conn, convert=True)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone() == (2,)
+    conn.execute("CREATE TABLE filler (data BLOB)")
+    conn.executemany("INSERT INTO filler VALUES (zeroblob(4000))", [()] * 300)
+    conn.execute("DROP TABLE filler")
+    freed = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    assert freed > 200
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    archive.run_maintenance(conn)
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] < freed
+    assert conn.execute("PRAGMA page_count").fetchone()[0] < pages
+    assert conn.execute("SELECT COUNT(*) FROM maintenance_log").fetchone() == (2,)
+    assert not archive.maintenance_due(conn)
+    assert archive.maintenance_due(conn, interval=0)
+    conn.close()
+
+    # audits see the hot database and the archive through one read-only view
+    audit = archive.open_audit_connection(cbt_env.db)
+    cycles = dict(audit.execute(
+        "SELECT cycle, COUNT(*) FROM all_sessions WHERE user_id IN ('early', 'resat', 'sitting') GROUP BY cycle"))
+    assert cycles == {'current': 2, '2026-jan': 3}
+    assert sorted(tuple(r) for r in audit.execute(
+        "SELECT cycle, user_id, question_id, session_id FROM all_answers "
+        "WHERE user_id IN ('early', 'resat', 'sitting')")) == [
+        ('2026-jan', 'early', 1, jan[1]), ('2026-jan', 'early', 2, jan[1]),
+        ('current', 'resat', 2, march), ('current', 'sitting', 1, in_progress),
+    ]
+    with pytest.raises(sqlite3.OperationalError, match='readonly'):
+        audit.execute("DELETE FROM sessions")
+    with pytest.raises(sqlite3.OperationalError, match='readonly'):
+        audit.execute("DELETE FROM arc0.sessions")
+    audit.close()
@@ -0,0 +1,170 @@
+"""Question-bank snapshots: publishing, pinning, the open-file cache and pruning.
+
+Uses a throwaway copy of cbt.db per test (see `conftest.py`).
+"""
+import threading
+
+QUESTION_FIELDS = ('question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option')
+
+
+def test_publish_round_trip(cbt_env):
+    snapshots = cbt_env.module('bank_snapshots')
+    conn = cbt_env.connect()
+    first = snapshots.publish_snapshot(conn)
+    snap = snapshots.load_snapshot(conn, first)
+
+    rows = conn.execute(f"SELECT id, {', '.join(QUESTION_FIELDS)} FROM questions ORDER BY id").fetchall()
+    assert snap.ids() == [r[0] for r in rows]
+    for row in rows:
+        assert snap.get(row[0]) == dict(zip(('id',) + QUESTION_FIELDS, row))
+    assert snap.get(10 ** 9) is None
+
+    # an unchanged bank is not published twice; a changed one is
+    assert snapshots.publish_snapshot(conn) == first
+    conn.execute("UPDATE questions SET question='Changed?' WHERE id=?", (rows[0][0],))
+    second = snapshots.publish_snapshot(conn)
+    assert second > first
+    assert snapshots.load_snapshot(conn, second).get(rows[0][0])['question'] == 'Changed?'
+    assert snapshots.load_snapshot(conn, first).get(rows[0][0])['question'] == rows[0][1]
+    conn.close()
+
+
+def test_concurrent_first_logins_publish_once(cbt_env):
+    app = cbt_env.app()
+    user_id, pin = cbt_env.query("SELECT user_id, pin FROM users WHERE active=1 LIMIT 1")[0]
+    app.test_client().get('/')  # let one request create the runtime schema first
+    start = threading.Barrier(8)
+    statuses = []
+
+    def login():
+        client = app.test_client()
+        start.wait()
+        statuses.append(client.post('/login', data={'user_id': user_id, 'pin': pin}).status_code)
+
+    threads = [threading.Thread(target=login) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert statuses == [302] * 8
+    assert cbt_env.query("SELECT COUNT(*) FROM bank_snapshots") == [(1,)]
+    assert not list((cbt_env.dir / 'snapshots').glob('*.tmp'))
+
+
+def test_exam_pinned_across_edit_and_delete(cbt_env):
+    app = cbt_env.app()
+    user_id, pin = cbt_env.query("SELECT user_id, pin FROM users WHERE active=1 LIMIT 1")[0]
+    admin = cbt_env.query("SELECT username, pin FROM admins WHERE active=1 LIMIT 1")[0]
+    client = app.test_client()
+    client.post('/login', data={'user_id': user_id, 'pin': pin})
+    client.post('/exam', data={'action': 'start_exam'})
+    with client.session_transaction() as session:
+        paper = session['questions']
+    first, second = paper[0], paper[1]
+    original = dict(zip(QUESTION_FIELDS, cbt_env.query(
+        f"SELECT {', '.join(QUESTION_FIELDS)} FROM questions WHERE id=?", (first,))[0]))
+
+    # mid-exam, an admin rewrites the first question (new key) and deletes the second
+    admin_client = app.test_client()
+    admin_client.post('/admin/login', data={'username': admin[0], 'pin': admin[1]})
+    wrong = next(o for o in ('option_a', 'option_b', 'option_c', 'option_d') if o != original['correct_option'])
+    edited = {**original, 'question': 'Rewritten mid-exam?', 'correct_option': wrong}
+    assert admin_client.post('/admin/questions', data={'action': 'edit', 'edit_id': first, **edited}).status_code == 200
+    assert admin_client.post('/admin/questions', data={'action': 'delete', 'delete_id': second}).status_code == 200
+    assert cbt_env.query("SELECT COUNT(*) FROM bank_snapshots") == [(3,)]
+
+    page = client.get('/exam').get_data(as_text=True)
+    assert 'Rewritten mid-exam?' not in page
+    client.post('/exam', data={'option': original['correct_option'], 'action': 'next'})
+    assert client.get('/results').status_code == 200
+
+    # scored against the paper as drawn: the old key, and the deleted question still counts
+    card_module = cbt_env.module('scorecards')
+    payload = cbt_env.query("SELECT payload FROM scorecards ORDER BY session_id DESC LIMIT 1")[0][0]
+    card = card_module.decode(payload)
+    assert card['score'] == 1
+    assert card['total'] == len(paper)
+    assert card['results'][0]['question'] == original['question']
+
+
+def test_open_cache_is_bounded(cbt_env):
+    snapshots = cbt_env.module('bank_snapshots')
+    conn = cbt_env.connect()
+    qid = conn.execute("SELECT MIN(id) FROM questions").fetchone()[0]
+    ids = []
+    for n in range(snapshots.MAX_OPEN + 3):
+        conn.execute("UPDATE questions SET question=? WHERE id=?", (f'version {n}', qid))
+        ids.append(snapshots.publish_snapshot(conn))
+    held = snapshots.load_snapshot(conn, ids[0])
+    for snapshot_id in ids[1:]:
+        snapshots.load_snapshot(conn, snapshot_id)
+    assert list(snapshots._open_snapshots) == ids[-snapshots.MAX_OPEN:]
+    # an evicted snapshot still in use keeps working
+    assert held.get(qid)['question'] == 'version 0'
+    conn.close()
+
+
+def test_prune_keeps_what_attempts_need(cbt_env):
+    snapshots = cbt_env.module('bank_snapshots')
+    conn = cbt_env.connect()
+    qid = conn.execute("SELECT MIN(id) FROM questions").fetchone()[0]
+    ids = []
+    for n in range(5):
+        conn.execute("UPDATE questions SET question=? WHERE id=?", (f'version {n}', qid))
+        ids.append(snapshots.publish_snapshot(conn))
+
+    def attempt(user_id, snapshot_id, submitted, scorecard):
+        session_id = conn.execute(
+            "INSERT INTO sessions (user_id, question_ids, started_at, submitted_at, snapshot_id) "
+            "VALUES (?, '[]', datetime('now'), ?, ?)",
+            (user_id, "2026-01-01" if submitted else None, snapshot_id),
+        ).lastrowid
+        if scorecard:
+            conn.execute("INSERT INTO scorecards VALUES (?, ?, x'00', datetime('now'))", (session_id, snapshot_id))
+
+    attempt('in-progress', ids[0], submitted=False, scorecard=False)
+    attempt('synced', ids[1], submitted=True, scorecard=False)
+    attempt('finished', ids[2], submitted=True, scorecard=True)
+
+    def filename(snapshot_id):
+        return conn.execute("SELECT filename FROM bank_snapshots WHERE id=?", (snapshot_id,)).fetchone()[0]
+
+    dry = snapshots.prune_snapshots(conn, dry_run=True)
+    assert sorted(p.name for p in dry) == sorted(filename(i) for i in (ids[2], ids[3]))
+    assert all(p.exists() for p in dry)
+
+    removed = snapshots.prune_snapshots(conn)
+    assert sorted(removed) == sorted(dry)
+    directory = cbt_env.dir / 'snapshots'
+    assert sorted(p.name for p in directory.glob('*.snap')) == sorted(filename(i) for i in (ids[0], ids[1], ids[4]))
+    assert conn.execute("SELECT COUNT(*) FROM bank_snapshots").fetchone() == (5,)
+    conn.close()
+
+
+def test_paper_questions_fall_back_to_live(cbt_env):
+    snapshots = cbt_env.module('bank_snapshots')
+    conn = cbt_env.connect()
+    first, second, third = (r[0] for r in conn.execute("SELECT id FROM questions ORDER BY id LIMIT 3"))
+    conn.execute("UPDATE questions SET question='Before?' WHERE id=?", (first,))
+    snapshot_id = snapshots.publish_snapshot(conn)
+    conn.execute("UPDATE questions SET question='After?' WHERE id=?", (first,))
+    added = conn.execute(
+        "INSERT INTO questions (question, option_a, option_b, option_c, option_d, correct_option) "
+        "VALUES ('Added later?', 'a', 'b', 'c', 'd', 'option_b')").lastrowid
+    conn.execute("DELETE FROM questions WHERE id=?", (second,))
+
+    # pinned questions come from the snapshot, ones it lacks from the live table,
+    # and ones found in neither are left out; paper order is kept
+    paper = snapshots.paper_questions(conn, snapshot_id, [added, first, 10 ** 9, second])
+    assert list(paper) == [added, first, second]
+    assert paper[first]['question'] == 'Before?'
+    assert paper[added] == {'id': added, 'question': 'Added later?', 'option_a': 'a', 'option_b': 'b',
+                            'option_c': 'c', 'option_d': 'd', 'correct_option': 'option_b'}
+
+    live = snapshots.live_questions(conn)
+    for missing_snapshot in (None, 10 ** 6):
+        paper = snapshots.paper_questions(conn, missing_snapshot, [first, second, third], live)
+        assert list(paper) == [first, third]
+        assert paper[first]['question'] == 'After?'
+    conn.close()
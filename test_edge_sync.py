@@ -0,0 +1,77 @@
+"""Round trip between an edge node and the central server.
+
+The central app runs in-process with Flask's test client against a throwaway
+copy of cbt.db (see `conftest.py`); the edge node is a fresh database in the
+same temp folder. `edge_sync._request` is routed through the test client, so
+the real signing, pull and push code runs without a network.
+"""
+import sqlite3
+from urllib.parse import urlsplit
+
+CENTRAL = 'http://central.test'
+NODE_ID = 'edge-test'
+
+
+def test_edge_round_trip(cbt_env):
+    cbt_env.setenv(CBT_NODE_ROLE='central', CBT_SYNC_KEY='test-sync-key')
+    edge_db = cbt_env.dir / 'edge.db'
+    app = cbt_env.app()
+    edge_sync = cbt_env.module('edge_sync')
+    current_snapshot_id = cbt_env.module('bank_snapshots').current_snapshot_id
+    client = app.test_client()
+
+    def request_via_client(url, data=None, headers=None):
+        path = urlsplit(url).path
+        if data is None:
+            resp = client.get(path, headers=headers)
+        else:
+            resp = client.post(path, data=data, headers=headers)
+        if resp.status_code >= 400:
+            raise edge_sync.SyncError(f'{url} returned HTTP {resp.status_code}: {resp.data[:200]!r}')
+        return resp.data, resp.headers
+
+    edge_sync._request = request_via_client
+
+    # the answer key is only served to callers holding the sync key
+    assert client.get('/sync/snapshot').status_code == 403
+
+    edge_sync.init_db(edge_db)
+    assert edge_sync.pull_snapshot(CENTRAL, edge_db) == 51
+
+    with sqlite3.connect(edge_db) as conn:
+        snapshot_id = current_snapshot_id(conn)
+        paper = [r[0] for r in conn.execute('SELECT id FROM questions ORDER BY id LIMIT 3')]
+        # 'testuser' exists centrally with PIN 1234; this one clashes
+        conn.executemany('INSERT INTO users (user_id, pin, active) VALUES (?, ?, 1)',
+                         [('testuser', '9999'), ('edge_only', '1111')])
+        for user_id in ('testuser', 'testuser', 'testuser', 'edge_only', 'edge_only'):
+            conn.execute(
+                """
+                INSERT INTO sessions (user_id, question_ids, answers, score, started_at, submitted_at,
+                                      answer_times, snapshot_id)
+                VALUES (?, ?, ?, 1, datetime('now'), datetime('now'), '{}', ?)
+                """,
+                (user_id, str(paper), f'{{"{paper[0]}": "option_a"}}', snapshot_id),
+            )
+
+    central = cbt_env.query
+
+    # held sessions fill the first batch but must not block the newer ones
+    assert edge_sync.push_attempts(CENTRAL, NODE_ID, edge_db, batch_size=2) == 2
+    assert central("SELECT COUNT(*) FROM sessions WHERE user_id='edge_only'") == [(2,)]
+    assert central("SELECT COUNT(*) FROM sync_conflicts") == [(1,)]
+    # synced attempts are pinned to the central copy of the same snapshot
+    assert central("SELECT COUNT(*) FROM sessions WHERE user_id='edge_only' AND snapshot_id IS NULL") == [(0,)]
+
+    # retrying neither duplicates attempts nor logs the conflict again
+    assert edge_sync.push_attempts(CENTRAL, NODE_ID, edge_db, batch_size=2) == 0
+    assert central("SELECT COUNT(*) FROM sessions WHERE user_id='edge_only'") == [(2,)]
+    assert central("SELECT COUNT(*) FROM sync_conflicts") == [(1,)]
+
+    # once the clash is resolved the held attempts go through
+    with sqlite3.connect(edge_db) as conn:
+        conn.execute("UPDATE users SET pin='1234' WHERE user_id='testuser'")
+    before = central("SELECT COUNT(*) FROM sessions WHERE user_id='testuser'")[0][0]
+    assert edge_sync.push_attempts(CENTRAL, NODE_ID, edge_db, batch_size=2) == 3
+    assert central("SELECT COUNT(*) FROM sessions WHERE user_id='testuser'") == [(before + 3,)]
+    assert edge_sync.push_attempts(CENTRAL, NODE_ID, edge_db, batch_size=2) == 0
@@ -0,0 +1,137 @@
+"""Answer-copying and timing analysis of a sitting.
+
+The pairwise and timing passes run on small hand-built cohorts with one
+known copier and one known outlier; `analyse` runs end to end on the same
+kind of sitting written into a throwaway copy of cbt.db (see `conftest.py`).
+"""
+import json
+
+import numpy as np
+import pytest
+
+OPTIONS = ('option_a', 'option_b', 'option_c', 'option_d')
+START = 1_767_261_600.0  # 2026-01-01 10:00:00 UTC
+
+
+def _sitting(n_candidates=40, n_items=30, source=3, copier=37, fast=20, seed=5):
+    """Answer keys, chosen options and answer timestamps for a synthetic sitting.
+
+    `copier` hands in `source`'s answers; `fast` answers every question in
+    about six seconds while everyone else takes about half a minute.
+    """
+    rng = np.random.default_rng(seed)
+    keys = rng.integers(0, 4, n_items)
+    skill = rng.uniform(0.55, 0.85, n_candidates)
+    skill[source] = 0.5
+    right = rng.random((n_candidates, n_items)) < skill[:, None]
+    chosen = np.where(right, keys, (keys + rng.integers(1, 4, (n_candidates, n_items))) % 4)
+    chosen[copier] = chosen[source]
+    pace = 30.0 * rng.lognormal(0.0, 0.25, n_candidates)
+    pace[fast] = 6.0
+    latency = pace[:, None] * rng.lognormal(0.0, 0.3, (n_candidates, n_items))
+    times = START + np.cumsum(latency, axis=1)
+    return keys, chosen, times
+
+
+def _cohort(integrity, keys, chosen, times):
+    n, items = chosen.shape
+    return integrity.Cohort(
+        list(range(1, n + 1)), [f'cand{i}' for i in range(n)], np.arange(1, items + 1),
+        (chosen + 1).astype(np.int8), chosen == keys, times, np.full(n, START),
+    )
+
+
+def test_similar_pairs_across_block_boundaries(cbt_env):
+    integrity = cbt_env.module('integrity')
+    cohort = _cohort(integrity, *_sitting())
+    pairs = integrity.similar_pairs(cohort)
+    assert [(i, j) for i, j, _, _ in pairs] == [(3, 37)]
+    shared = pairs[0][2]
+    assert shared == int((~cohort.correct[3]).sum()) >= integrity.MIN_IDENTICAL_WRONG
+
+    # the copier sits in a later row block than its source; blocks that do
+    # not divide the cohort evenly must give the same answer
+    for block in (1, 3, 7, 16):
+        assert integrity.similar_pairs(cohort, block=block) == [pytest.approx(p) for p in pairs]
+
+
+def test_weak_candidates_are_not_flagged_for_being_weak(cbt_env):
+    integrity = cbt_env.module('integrity')
+    keys, chosen, times = _sitting(n_candidates=60)
+    # two independent weak candidates share many wrong answers by chance alone
+    rng = np.random.default_rng(9)
+    for i in (10, 11):
+        chosen[i] = np.where(rng.random(len(keys)) < 0.2, keys, (keys + rng.integers(1, 4, len(keys))) % 4)
+    pairs = integrity.similar_pairs(_cohort(integrity, keys, chosen, times))
+    assert [(i, j) for i, j, _, _ in pairs] == [(3, 37)]
+
+
+def test_timing_outliers(cbt_env):
+    integrity = cbt_env.module('integrity')
+    keys, chosen, times = _sitting()
+    flags = integrity.timing_anomalies(_cohort(integrity, keys, chosen, times))
+    assert [i for i, *_ in flags] == [20]
+    _, z, median, fast = flags[0]
+    assert z <= -integrity.TIMING_Z and 4 < median < 9 and fast < integrity.FAST_FRACTION
+
+    # too few timed answers gives no verdict
+    times[20, integrity.MIN_TIMED - 1:] = np.nan
+    assert integrity.timing_anomalies(_cohort(integrity, keys, chosen, times)) == []
+
+
+def test_timing_with_zero_mad(cbt_env):
+    integrity = cbt_env.module('integrity')
+    keys, chosen, _ = _sitting(n_candidates=21, n_items=10, copier=12)
+    # everyone keeps exactly the same pace, so the MAD is 0
+    times = START + np.cumsum(np.full(chosen.shape, 30.0), axis=1)
+    assert integrity.timing_anomalies(_cohort(integrity, keys, chosen, times)) == []
+
+    times[4] = START + np.cumsum(np.full(10, 8.0))
+    flags = integrity.timing_anomalies(_cohort(integrity, keys, chosen, times))
+    assert [i for i, *_ in flags] == [4]
+    assert np.isfinite(flags[0][1]) and flags[0][1] <= -integrity.TIMING_Z
+
+    # answering most questions within seconds is flagged whatever the spread
+    times[7] = START + np.cumsum(np.full(10, 1.0))
+    assert [i for i, *_ in integrity.timing_anomalies(_cohort(integrity, keys, chosen, times))] == [4, 7]
+
+
+def test_analyse_writes_flags(cbt_env):
+    integrity = cbt_env.module('integrity')
+    conn = cbt_env.connect()
+    questions = conn.execute(
+        "SELECT id, correct_option FROM questions WHERE option_c != '' AND option_d != '' ORDER BY id LIMIT 30"
+    ).fetchall()
+    ids = [q for q, _ in questions]
+    keys = np.array([OPTIONS.index(k) for _, k in questions])
+    _, chosen, times = _sitting()
+    # re-key the synthetic answers so right and wrong match the real answer keys
+    synthetic_keys, _, _ = _sitting()
+    chosen = (chosen - synthetic_keys + keys) % 4
+
+    session_ids = []
+    for n in range(len(chosen)):
+        session_ids.append(conn.execute(
+            """
+            INSERT INTO sessions (user_id, question_ids, answers, answer_times, started_at, submitted_at)
+            VALUES (?, ?, ?, ?, datetime(?, 'unixepoch'), '2026-01-01 11:00:00')
+            """,
+            (f'cand{n}', json.dumps(ids),
+             json.dumps({str(q): OPTIONS[o] for q, o in zip(ids, chosen[n])}),
+             json.dumps({str(q): t for q, t in zip(ids, times[n])}), START),
+        ).lastrowid)
+
+    summary = integrity.analyse(conn, '2026-jan', '2026-01-01', '2026-02-01')
+    assert summary == {'attempts': 40, 'pairs': 1, 'timing': 1}
+    flags = conn.execute(
+        "SELECT kind, session_id, user_id, other_session_id, other_user_id FROM integrity_flags "
+        "WHERE cohort='2026-jan' ORDER BY kind").fetchall()
+    assert flags == [('pair', session_ids[3], 'cand3', session_ids[37], 'cand37'),
+                     ('timing', session_ids[20], 'cand20', None, None)]
+
+    # re-running replaces the cohort's flags; an empty range clears them
+    assert integrity.analyse(conn, '2026-jan', '2026-01-01', '2026-02-01') == summary
+    assert conn.execute("SELECT COUNT(*) FROM integrity_flags").fetchone() == (2,)
+    assert integrity.analyse(conn, '2026-jan', '2030-01-01', '2030-02-01') == {'attempts': 0, 'pairs': 0, 'timing': 0}
+    assert conn.execute("SELECT COUNT(*) FROM integrity_flags").fetchone() == (0,)
+    conn.close()
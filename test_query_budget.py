@@ -0,0 +1,73 @@
+"""Check that each endpoint stays within its SQL query budget.
+
+Runs the app in-process with Flask's test client against a throwaway copy
+of cbt.db (see `conftest.py`), so it needs no running server and leaves the
+project directory untouched.
+"""
+
+# Queries per request once the process is warm (schema checked, snapshot cached)
+BUDGETS = {
+    'login': 5,         # user, current snapshot, sibling map, clear answers, new attempt
+    'exam': 0,          # question from the snapshot, answers from the session
+    'results': 5,       # scorecard lookup, saved answers, finalise, store + read back scorecard
+    'results_again': 0, # finalised scorecard comes from the LRU cache
+    'admin_users': 1,
+    'admin_questions': 1,
+    'deactivate_user': 1,
+    'reactivate_user': 1,
+}
+
+
+def _check(resp, status, location=None):
+    """The request under budget still did its job: right status, right redirect."""
+    assert resp.status_code == status, resp.get_data(as_text=True)[:200]
+    if location is not None:
+        assert resp.headers['Location'] == location
+
+
+def test_query_budgets(cbt_env):
+    app = cbt_env.app()
+    assert_max_queries = cbt_env.module('repository').assert_max_queries
+    user = cbt_env.query("SELECT id, user_id, pin FROM users WHERE active=1 LIMIT 1")
+    admin = cbt_env.query("SELECT username, pin FROM admins WHERE active=1 LIMIT 1")
+    assert user and admin, 'need an active user and an active admin in cbt.db'
+    user_pk, user_id, pin = user[0]
+    admin = admin[0]
+
+    client = app.test_client()
+    # warm-up: first request creates the runtime schema, indexes and caches
+    client.post('/login', data={'user_id': user_id, 'pin': pin})
+    client.post('/exam', data={'action': 'start_exam'})
+
+    with assert_max_queries(BUDGETS['login']):
+        _check(client.post('/login', data={'user_id': user_id, 'pin': pin}), 302, '/exam')
+    _check(client.post('/exam', data={'action': 'start_exam'}), 302, '/exam')
+    with assert_max_queries(BUDGETS['exam']):
+        _check(client.get('/exam'), 200)
+        _check(client.post('/exam', data={'option': 'option_a', 'action': 'next'}), 200)
+        _check(client.post('/exam', data={'jump_to': '0'}), 200)
+    with assert_max_queries(BUDGETS['results']):
+        first = client.get('/results')
+        _check(first, 200)
+    with assert_max_queries(BUDGETS['results_again']):
+        again = client.get('/results')
+        _check(again, 200)
+    assert again.data == first.data
+    # finalising committed: another connection sees the submitted attempt and its scorecard
+    assert cbt_env.query(
+        "SELECT COUNT(*) FROM sessions JOIN scorecards ON scorecards.session_id = sessions.id "
+        "WHERE sessions.user_id=? AND submitted_at IS NOT NULL", (user_id,)) == [(1,)]
+    _check(client.get('/exam'), 302, '/results')
+
+    admin_client = app.test_client()
+    _check(admin_client.post('/admin/login', data={'username': admin[0], 'pin': admin[1]}), 302, '/admin')
+    with assert_max_queries(BUDGETS['admin_users']):
+        _check(admin_client.get('/admin/users'), 200)
+    with assert_max_queries(BUDGETS['admin_questions']):
+        _check(admin_client.get('/admin/questions'), 200)
+    with assert_max_queries(BUDGETS['deactivate_user']):
+        _check(admin_client.post(f'/deactivate_user/{user_pk}'), 302, '/admin/users')
+    assert cbt_env.query("SELECT active FROM users WHERE id=?", (user_pk,)) == [(0,)]
+    with assert_max_queries(BUDGETS['reactivate_user']):
+        _check(admin_client.post(f'/reactivate_user/{user_pk}'), 302, '/admin/inactive_users')
+    assert cbt_env.query("SELECT active FROM users WHERE id=?", (user_pk,)) == [(1,)]
@@ -0,0 +1,60 @@
+"""Batch scorecard rendering: zip parts, failures and resuming.
+
+Runs `scorecard_batch.generate` on a real process pool against a throwaway
+copy of cbt.db (see `conftest.py`).
+"""
+import json
+import zipfile
+
+
+def _add_attempts(cbt_env, user_ids, question_ids='[1, 2, 3]'):
+    conn = cbt_env.connect()
+    for user_id in user_ids:
+        conn.execute(
+            """
+            INSERT INTO sessions (user_id, question_ids, answers, started_at, submitted_at)
+            VALUES (?, ?, ?, '2026-03-01 09:00:00', '2026-03-01 10:00:00')
+            """,
+            (user_id, question_ids, json.dumps({'1': 'option_a'})),
+        )
+    conn.close()
+
+
+def _entries(directory):
+    return {path.name: sorted(zipfile.ZipFile(path).namelist()) for path in sorted(directory.glob('part-*.zip'))}
+
+
+def test_parts_failures_and_resume(cbt_env):
+    batch = cbt_env.module('scorecard_batch')
+    _add_attempts(cbt_env, ['cand1', 'cand2', 'cand3'])
+    _add_attempts(cbt_env, ['broken'], question_ids='not json')
+    _add_attempts(cbt_env, ['cand4', 'cand5', 'cand6'])
+    out = cbt_env.dir / 'scorecards'
+    directory = out / 'march'
+
+    def run():
+        # small parts and pool generations so both roll over within 7 attempts
+        return batch.generate(cbt_env.db, 'march', '2026-03-01', '2026-04-01', out,
+                              workers=2, part_size=2, recycle=3)
+
+    # the broken attempt is counted and the rest of the sitting still renders
+    assert run() == {'total': 7, 'rendered': 6, 'skipped': 0, 'errors': 1, 'parts': 3}
+    parts = _entries(directory)
+    assert list(parts) == ['part-0001.zip', 'part-0002.zip', 'part-0003.zip']
+    assert all(len(names) == 2 for names in parts.values())
+    stems = {name.rsplit('.', 1)[0] for names in parts.values() for name in names}
+    assert {stem.rsplit('-', 1)[0] for stem in stems} == {f'cand{n}' for n in range(1, 7)}
+    card = zipfile.ZipFile(directory / 'part-0001.zip').read(parts['part-0001.zip'][0]).decode()
+    assert 'Final Score' in card
+
+    # a part left open by a killed run is discarded; finished entries are skipped
+    (directory / 'part-0004.zip.partial').write_bytes(b'truncated')
+    assert run() == {'total': 7, 'rendered': 0, 'skipped': 6, 'errors': 1, 'parts': 0}
+    assert not (directory / 'part-0004.zip.partial').exists()
+
+    # once the attempt is repaired, a re-run renders only that one
+    conn = cbt_env.connect()
+    conn.execute("UPDATE sessions SET question_ids='[1, 2, 3]' WHERE user_id='broken'")
+    conn.close()
+    assert run() == {'total': 7, 'rendered': 1, 'skipped': 6, 'errors': 0, 'parts': 1}
+    assert [n.rsplit('-', 1)[0] for n in _entries(directory)['part-0004.zip']] == ['broken']
@@ -0,0 +1,108 @@
+"""Stored scorecards: compression, the LRU cache and clean-up with the attempt.
+
+Uses a throwaway copy of cbt.db (see `conftest.py`).
+"""
+import json
+
+
+def _paper(conn, size=50):
+    columns = ('id', 'question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option')
+    return [dict(zip(columns, r)) for r in conn.execute(f"SELECT {', '.join(columns)} FROM questions LIMIT ?", (size,))]
+
+
+def _attempt(conn, user_id='u1', snapshot_id=1):
+    return conn.execute(
+        "INSERT INTO sessions (user_id, question_ids, started_at, submitted_at, snapshot_id) "
+        "VALUES (?, '[]', datetime('now'), datetime('now'), ?)", (user_id, snapshot_id),
+    ).lastrowid
+
+
+def _counting(conn):
+    """Statements run on `conn` from now on."""
+    statements = []
+    conn.set_trace_callback(statements.append)
+    return statements
+
+
+def test_compressed_round_trip(cbt_env):
+    scorecards = cbt_env.module('scorecards')
+    conn = cbt_env.connect()
+    paper = _paper(conn)
+    card = scorecards.build_scorecard(paper, {q['id']: q['correct_option'] for q in paper[:30]})
+    assert (card['score'], card['total'], card['answered'], card['skipped']) == (30, 50, 30, 20)
+
+    blob = scorecards.encode(card)
+    assert scorecards.decode(blob) == card
+    assert len(blob) < len(json.dumps(card)) / 2
+
+    attempt_id = _attempt(conn)
+    scorecards.store_scorecard(conn, attempt_id, 1, card)
+    assert scorecards.decode(conn.execute(
+        "SELECT payload FROM scorecards WHERE session_id=?", (attempt_id,)).fetchone()[0]) == card
+    conn.close()
+
+
+def test_first_scorecard_wins_and_is_cached(cbt_env):
+    scorecards = cbt_env.module('scorecards')
+    conn = cbt_env.connect()
+    paper = _paper(conn, 5)
+    first = scorecards.build_scorecard(paper, {})
+    second = scorecards.build_scorecard(paper, {q['id']: q['correct_option'] for q in paper})
+    attempt_id = _attempt(conn)
+    scorecards.store_scorecard(conn, attempt_id, 1, first)
+    scorecards.store_scorecard(conn, attempt_id, 1, second)
+
+    statements = _counting(conn)
+    assert scorecards.get_scorecard(conn, attempt_id, 1) == first
+    assert len(statements) == 1
+    assert scorecards.get_scorecard(conn, attempt_id, 1) == first
+    assert len(statements) == 1  # served from the cache
+
+    # the key includes the snapshot: another snapshot's card is a miss, not this one
+    assert scorecards.get_scorecard(conn, attempt_id, 2) is None
+    assert len(statements) == 2
+    conn.close()
+
+
+def test_cache_evicts_least_recently_used(cbt_env):
+    scorecards = cbt_env.module('scorecards')
+    cache = scorecards.LRUCache(maxsize=2)
+    cache.put((1, 1), {'score': 1})
+    cache.put((2, 1), {'score': 2})
+    assert cache.get((1, 1)) == {'score': 1}  # now most recently used
+    cache.put((3, 1), {'score': 3})
+    assert cache.get((2, 1)) is None
+    assert cache.get((1, 1)) == {'score': 1} and cache.get((3, 1)) == {'score': 3}
+
+
+def test_nothing_stored_for_attempts_not_in_sessions(cbt_env):
+    scorecards = cbt_env.module('scorecards')
+    conn = cbt_env.connect()
+    card = scorecards.build_scorecard(_paper(conn, 3), {})
+    # e.g. archived while the candidate still had the results page open
+    scorecards.store_scorecard(conn, 10 ** 6, 1, card)
+    assert conn.execute("SELECT COUNT(*) FROM scorecards").fetchone() == (0,)
+    assert scorecards.get_scorecard(conn, 10 ** 6, 1) is None
+    conn.close()
+
+
+def test_deleting_a_user_removes_their_scorecards(cbt_env):
+    app = cbt_env.app()
+    user_pk, user_id, pin = cbt_env.query("SELECT id, user_id, pin FROM users WHERE active=1 LIMIT 1")[0]
+    admin = cbt_env.query("SELECT username, pin FROM admins WHERE active=1 LIMIT 1")[0]
+    client = app.test_client()
+    for _ in range(2):
+        client.post('/login', data={'user_id': user_id, 'pin': pin})
+        client.post('/exam', data={'action': 'start_exam'})
+        client.post('/exam', data={'option': 'option_a', 'action': 'next'})
+        assert client.get('/results').status_code == 200
+    other = _attempt(cbt_env.connect(), user_id='someone-else')
+    assert cbt_env.query("SELECT COUNT(*) FROM scorecards") == [(2,)]
+
+    admin_client = app.test_client()
+    admin_client.post('/admin/login', data={'username': admin[0], 'pin': admin[1]})
+    assert admin_client.post(f'/delete_user/{user_pk}').status_code == 302
+    assert cbt_env.query("SELECT COUNT(*) FROM scorecards") == [(0,)]
+    assert cbt_env.query("SELECT COUNT(*) FROM sessions WHERE user_id=?", (user_id,)) == [(0,)]
+    assert cbt_env.query("SELECT COUNT(*) FROM answers WHERE user_id=?", (user_id,)) == [(0,)]
+    assert cbt_env.query("SELECT id FROM sessions WHERE user_id='someone-else'") == [(other,)]
@@ -0,0 +1,92 @@
+"""Near-duplicate index, sibling-free paper draws and question deletion.
+
+Uses a throwaway copy of cbt.db (see `conftest.py`).
+"""
+import itertools
+import random
+
+OPTIONS = ('option_a', 'option_b', 'option_c', 'option_d')
+
+
+def test_lsh_finds_near_duplicates(cbt_env):
+    similarity_index = cbt_env.module('similarity_index')
+    conn = cbt_env.connect()
+    similarity_index.rebuild(conn)
+    rows = [dict(zip(('id', 'question') + OPTIONS, r)) for r in conn.execute(
+        "SELECT id, question, option_a, option_b, option_c, option_d FROM questions")]
+
+    # two near-copies of every question: options shuffled and the stem
+    # recased, or one option swapped for a stock distractor
+    rng = random.Random(1)
+    copies = {}
+    next_id = 10_000
+    for row in rows:
+        options = [row[o] for o in OPTIONS]
+        rng.shuffle(options)
+        shuffled = {'question': row['question'].upper(), **dict(zip(OPTIONS, options))}
+        swapped = {**row, 'option_d': 'None of the above'}
+        for variant in (shuffled, swapped):
+            next_id += 1
+            copies[next_id] = row['id']
+            found = similarity_index.index_question(conn, next_id, similarity_index.question_text(variant))
+            if variant is shuffled:
+                assert row['id'] in found
+
+    # the bucket lookups find every pair that a comparison of all signatures would
+    signatures = {q: similarity_index._SIGNATURE.unpack(s)
+                  for q, s in conn.execute("SELECT question_id, signature FROM question_signatures")}
+    expected = {(a, b) for a, b in itertools.combinations(sorted(signatures), 2)
+                if similarity_index.similarity(signatures[a], signatures[b]) >= similarity_index.THRESHOLD}
+    found = set(conn.execute("SELECT question_id, sibling_id FROM question_siblings WHERE question_id < sibling_id"))
+    assert found <= expected
+    assert len(found) >= 0.95 * len(expected)
+    assert {(copies[b], b) for b in copies} & expected <= found
+    conn.close()
+
+
+def test_draw_paper_keeps_siblings_apart(cbt_env):
+    similarity_index = cbt_env.module('similarity_index')
+    # ten clusters of three mutual near-duplicates, plus 20 unrelated questions
+    clusters = [set(range(n, n + 3)) for n in range(1, 31, 3)]
+    siblings = {q: cluster - {q} for cluster in clusters for q in cluster}
+    bank = list(range(1, 51))
+    for _ in range(500):
+        paper = similarity_index.draw_paper(bank, 30, siblings)
+        assert len(paper) == len(set(paper)) == 30
+        assert all(len(cluster & set(paper)) == 1 for cluster in clusters)
+
+
+def test_draw_paper_tops_up_from_siblings(cbt_env):
+    similarity_index = cbt_env.module('similarity_index')
+    clusters = [set(range(n, n + 3)) for n in range(1, 31, 3)]
+    siblings = {q: cluster - {q} for cluster in clusters for q in cluster}
+    bank = list(range(1, 31))  # only ten sibling-free picks exist
+
+    paper = similarity_index.draw_paper(bank, 25, siblings)
+    assert len(paper) == len(set(paper)) == 25
+    # one per cluster comes first; the rest is topped up from the excluded ones
+    assert all(len(cluster & set(paper[:10])) == 1 for cluster in clusters)
+
+    assert sorted(similarity_index.draw_paper(bank, 40, siblings)) == bank
+
+
+def test_delete_rejects_bad_ids(cbt_env):
+    app = cbt_env.app()
+    admin = cbt_env.query("SELECT username, pin FROM admins WHERE active=1 LIMIT 1")[0]
+    client = app.test_client()
+    client.post('/admin/login', data={'username': admin[0], 'pin': admin[1]})
+    client.get('/admin/questions')  # creates the runtime schema
+    questions = cbt_env.query("SELECT COUNT(*) FROM questions")[0][0]
+    snapshots = cbt_env.query("SELECT COUNT(*) FROM bank_snapshots")[0][0]
+
+    for bad in ('', 'abc', '1 OR 1=1', '999999'):
+        assert client.post('/admin/questions', data={'action': 'delete', 'delete_id': bad}).status_code == 200
+    assert client.post('/admin/questions', data={'action': 'delete'}).status_code == 200
+    assert cbt_env.query("SELECT COUNT(*) FROM questions") == [(questions,)]
+    assert cbt_env.query("SELECT COUNT(*) FROM bank_snapshots") == [(snapshots,)]
+
+    qid = cbt_env.query("SELECT MIN(id) FROM questions")[0][0]
+    client.post('/admin/questions', data={'action': 'delete', 'delete_id': str(qid)})
+    assert cbt_env.query("SELECT COUNT(*) FROM questions") == [(questions - 1,)]
+    assert cbt_env.query("SELECT COUNT(*) FROM bank_snapshots") == [(snapshots + 1,)]
+    assert cbt_env.query("SELECT COUNT(*) FROM question_signatures WHERE question_id=?", (qid,)) == [(0,)]